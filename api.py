@@ -0,0 +1,199 @@
+# api.py
+# Lightweight asyncio HTTP service for risk scores and chart SVGs, so other
+# systems can poll them without holding a Streamlit session.
+#
+#   python app.py --serve-api [--host 127.0.0.1] [--port 8502] [--store data/patients]
+#
+#   GET /patients/<id>/risk.json        risk % and its inputs
+#   GET /patients/<id>/gauge.svg        semi_gauge_svg (?compact=1 for the header size)
+#   GET /cohort/genetic.svg             bar_svg of the cohort's genetic abnormalities
+#   GET /cohort/shunt.svg               donut_svg of the cohort's shunt sizes
+#   GET /health
+#
+# Responses carry a strong ETag and honour If-None-Match, and rendered bodies are
+# kept in one LRU shared by every client, so a poll that hasn't changed costs a
+# dict lookup and a 304.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from charts import RenderCache, semi_gauge_svg, bar_svg, donut_svg
+from cohort import CohortAggregates, shunt_percentages
+from edits import open_edit_log
+from patients import PatientStore, store_version
+from risk import score_record
+from views import donut_segments
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "patients")
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+class NotFound(Exception):
+    pass
+
+# ======================== DATA ========================
+class Cohort:
+    # The store plus its cohort counters, reopened when the store files change on disk, with the
+    # edits the dashboard has committed to the store's edit log applied on top.
+    def __init__(self, path:str, recheck_s:float=1.0):
+        self.path = path
+        self.recheck_s = recheck_s
+        self._checked = 0.0
+        self._store_version = None
+        self.edits = open_edit_log(path, readonly=True)
+        self._refresh()
+
+    def _refresh(self):
+        version = store_version(self.path)
+        if self.edits is None:
+            self.edits = open_edit_log(self.path, readonly=True)  # the dashboard may have started one since
+            changed = {pid for pid, _ in self.edits.items()} if self.edits is not None else set()
+        else:
+            changed = self.edits.refresh()
+        if version != self._store_version:
+            try:
+                store = PatientStore(self.path)
+            except ValueError:
+                if self._store_version is None:
+                    raise
+                store = None  # caught mid-rewrite: keep the old store and try again next check
+            if store is not None:
+                self.store, self.aggregates = store, CohortAggregates(store)
+                self._store_version = version
+                changed = {pid for pid, _ in self.edits.items()} if self.edits is not None else set()
+        for pid in changed:
+            rec = self.store.get(pid)
+            if rec is not None:
+                self.aggregates.upsert({**rec, **self.edits.get(pid)})
+        # responses are cached per version, so it moves with the store and with committed edits
+        self.version = (self._store_version, self.edits.generation if self.edits is not None else -1)
+        self._checked = time.monotonic()
+
+    def current(self):
+        if time.monotonic() - self._checked > self.recheck_s:
+            self._refresh()
+        return self
+
+    def record(self, patient_id:str)->dict:
+        rec = self.store.get(patient_id)
+        if rec is None:
+            raise NotFound(f"unknown patient {patient_id}")
+        if self.edits is not None:
+            rec.update(self.edits.get(patient_id))
+        return rec
+
+# ======================== ROUTES ========================
+def render(cohort:Cohort, path:str, compact:bool=False):
+    # (content type, body) for a GET path
+    parts = [unquote(p) for p in path.strip("/").split("/")]
+    if parts == ["health"]:
+        return "application/json", json.dumps(dict(status="ok", patients=len(cohort.store)))
+    if len(parts) == 3 and parts[0] == "patients":
+        rec = cohort.record(parts[1])
+        if parts[2] == "risk.json":
+            return "application/json", json.dumps(dict(
+                patient_id=rec["patient_id"], risk_pct=score_record(rec), base_risk=rec["base_risk"],
+                is_premature=rec["is_premature"], weight_kg=rec["weight_kg"], cpb_time=rec["cpb_time"],
+                tapvr=rec["tapvr"], bmi_cat=rec["bmi_cat"]))
+        if parts[2] == "gauge.svg":
+            return "image/svg+xml", semi_gauge_svg(score_record(rec), compact=compact).strip()
+    if parts == ["cohort", "genetic.svg"]:
+        counts, _ = cohort.aggregates.counts()
+        return "image/svg+xml", bar_svg(counts)
+    if parts == ["cohort", "shunt.svg"]:
+        _, shunt_counts = cohort.aggregates.counts()
+        return "image/svg+xml", donut_svg(donut_segments(shunt_percentages(shunt_counts)))
+    raise NotFound(path)
+
+# ======================== HTTP ========================
+class ApiServer:
+    def __init__(self, store_path:str, max_age:int=5, cache_size:int=4096):
+        self.cohort = Cohort(store_path)
+        self.max_age = max_age
+        self.responses = RenderCache(cache_size)  # (version, path, compact) -> (type, body, etag)
+
+    def respond(self, method:str, target:str, headers:dict):
+        if method not in ("GET", "HEAD"):
+            return 405, "text/plain", b"method not allowed\n", None
+        url = urlsplit(target)
+        cohort = self.cohort.current()
+        # Key on the one parameter any route reads, so stray query strings can't flood the cache.
+        compact = url.path.endswith("/gauge.svg") and parse_qs(url.query).get("compact", ["0"])[0] in ("1", "true")
+
+        def build():
+            ctype, body = render(cohort, url.path, compact)
+            body = body.encode("utf-8")
+            return ctype, body, '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+        try:
+            ctype, body, etag = self.responses.get_or_render((cohort.version, url.path, compact), build)
+        except NotFound as e:
+            return 404, "text/plain", f"not found: {e}\n".encode(), None  # not cached: id scans would evict hot entries
+        if etag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+            return 304, ctype, b"", etag
+        return 200, ctype, body, etag
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=15)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(self._response(400, "text/plain", b"bad request\n", None, False, False))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, ctype, body, etag = self.respond(method, target, headers)
+                writer.write(self._response(status, ctype, body, etag, keep_alive, method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _response(self, status, ctype, body, etag, keep_alive, head_only)->bytes:
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}",
+                 f"Content-Type: {ctype}; charset=utf-8" if ctype.startswith(("text/", "application/json")) else f"Content-Type: {ctype}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status != 304:
+            lines.append(f"Content-Length: {len(body)}")
+        if etag is not None:
+            lines += [f"ETag: {etag}", f"Cache-Control: max-age={self.max_age}, must-revalidate"]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if head_only or status == 304 else body)
+
+async def serve(store_path:str, host:str, port:int, max_age:int):
+    api = ApiServer(store_path, max_age)
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"serving {len(api.cohort.store):,} patients from {store_path} on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="app.py --serve-api", description="Serve risk scores and chart SVGs over HTTP")
+    ap.add_argument("--serve-api", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8502)
+    ap.add_argument("--store", default=os.environ.get("PATIENT_STORE", DEFAULT_STORE), help="patient store directory")
+    ap.add_argument("--max-age", type=int, default=5, help="seconds clients may reuse a response before revalidating")
+    args = ap.parse_args(argv)
+    if not os.path.isdir(args.store):
+        ap.error(f"no patient store at {args.store} (generate one with `python patients.py 20000 {args.store}`)")
+    try:
+        asyncio.run(serve(args.store, args.host, args.port, args.max_age))
+    except KeyboardInterrupt:
+        pass
+    return 0
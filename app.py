@@ -1,186 +1,33 @@
 # app.py
+import inspect
+import os
+import sys
+import numpy as np
 import streamlit as st
-import math
 from datetime import date
 
+# `python app.py --serve-api` runs the HTTP API instead of the dashboard
+if __name__ == "__main__" and not st.runtime.exists() and "--serve-api" in sys.argv:
+    import api
+    sys.exit(api.main(sys.argv[1:]))
+
+import charts
+from charts import bar_svg, donut_svg, vitals_svg, wall_defs_svg, wall_row_svg
+from patients import SCHEMA, GENDERS, BMI_CATS, TAPVR, GENETIC, SHUNT_SIZES
+from risk import DEFAULT_COEFFICIENTS, score_patient, stable_slots, top_k
+from cohort import shunt_percentages
+from shared import SharedCohort
+from neighbours import shunt_summary
+from events import STAGES
+from views import THEME_CSS, risk_header_html, topband_html, surgical_html, flow_html, donut_segments, pill_html
+from vitals import open_source as open_vitals
+import perf
+
 st.set_page_config(page_title="Patient Overview", layout="wide")
 
 # ======================== THEME & GLOBAL CSS (Dark-blue) ========================
-st.markdown("""
-<style>
-header[data-testid="stHeader"]{display:none !important;}
-#MainMenu, footer{visibility:hidden !important;}
-.block-container{padding-top:4px !important; padding-bottom:4px !important; max-width:1400px;}
-[data-testid="stVerticalBlock"] > [style*="width"]{padding-top:2px !important; padding-bottom:2px !important;}
-[data-testid="column"]{padding:0 6px !important;}
-
-/* -------- Dark blue neutral theme -------- */
-:root{
-  --bg:#0F172A;                 /* page bg (deep slate/navy) */
-  --band:#12263F;               /* top band bg */
-  --band-border:#24425F;
-  --side:#12213B;               /* left nav card */
-  --ink:#F8FAFC;                /* default text: near-white */
-  --heading:#FFFFFF;            /* headings: pure white */
-  --muted:#C7D2FE;              /* readable light indigo */
-  --card:#0B1426;               /* dark card surface */
-  --border:#1E2A44;
-
-  --brand-coral:#F97362;        /* accents */
-  --brand-teal:#22D3EE;
-
-  /* BAR CHART = ALL REDS */
-  --bar1:#FCA5A5; --bar2:#F87171; --bar3:#EF4444; --bar4:#DC2626;
-
-  /* Donut */
-  --donut1:#F97362; --donut2:#22D3EE; --donut3:#38BDF8; --donut4:#93C5FD;
-}
-
-html, body, .stApp, [data-testid="stAppViewContainer"], .main {
-  background: var(--bg) !important; color: var(--ink) !important;
-}
-*{ color: var(--ink); font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, "Helvetica Neue", Arial, "Noto Sans", "Apple Color Emoji","Segoe UI Emoji"; }
-.muted{ color: var(--muted) !important; }
-
-/* Left card - more compact */
-.side{ background: var(--side); border:1px solid var(--band-border); border-radius:10px; padding:10px 14px; }
-.side h3{ margin:0 0 6px; letter-spacing:.14em; color: var(--heading); font-weight:1000; font-size:18px; line-height:1.1; white-space:nowrap; }
-.side p{ margin:2px 0 0; font-weight:800; font-size:13px; }
-
-/* Top band - more compact */
-.topband{ background: var(--band); border:1px solid var(--band-border); border-radius:8px; padding:8px 14px; margin-bottom:8px; position:relative; }
-.kvgrid{display:grid; grid-template-columns:repeat(7, 1fr); gap:12px; align-items:center;}
-.kv .label{ font-size:12px; font-weight:1000; letter-spacing:.12em; color: var(--heading); white-space:nowrap; }
-.kv .val{ margin-top:2px; font-size:15px; font-weight:900; }
-.baby{ width:38px;height:38px;border-radius:999px;border:2px solid var(--band-border); display:flex;align-items:center;justify-content:center;background:#0b1a30;font-size:18px; }
-
-/* Premature icon in top right - conditional */
-.premature-icon{ position:absolute; top:8px; right:14px; width:40px;height:40px;border-radius:999px;border:2px solid #F97362; display:flex;align-items:center;justify-content:center;background:#1a0f0f;font-size:18px; box-shadow:0 2px 6px rgba(249,115,98,0.3); }
-.premature-icon.hidden{ display:none; }
-
-/* Risk section at top - more compact */
-.risk-header{ background:linear-gradient(135deg, #1a0f0f 0%, #2a1515 100%); border:2px solid #F97362; border-radius:10px; padding:10px 14px; margin-bottom:8px; box-shadow:0 3px 10px rgba(249,115,98,0.2); }
-.risk-title{ font-weight:1000; font-size:18px; letter-spacing:.08em; color: #F97362; text-align:center; margin-bottom:6px; }
-.risk-display{ display:flex; align-items:center; justify-content:space-around; gap:16px; }
-.risk-percentage{ font-size:42px; font-weight:1000; color: #F97362; text-align:center; line-height:1; }
-.risk-label{ font-size:12px; font-weight:800; color: var(--muted); text-align:center; margin-top:3px; letter-spacing:.08em; }
-.risk-toggle-container{ display:flex; align-items:center; justify-content:center; gap:8px; margin-top:6px; }
-
-/* Headings - more compact */
-.h2{font-weight:1000; font-size:17px; letter-spacing:.08em; color: var(--heading); white-space:nowrap; margin:4px 0 3px;}
-.h3{font-weight:900;  font-size:15px; letter-spacing:.06em; color: var(--heading); white-space:nowrap; margin:3px 0 2px;}
-
-/* Cards - more compact */
-.card{background:var(--card); border:1px solid var(--border); border-radius:10px; padding:8px 12px;}
-.card + .card{margin-top:6px;}
-
-/* Flow (steps 1..6) - more compact */
-.flowgrid{display:grid; grid-template-columns: 1fr 28px 1fr 28px 1fr; row-gap:10px; column-gap:8px; align-items:center; margin-top:4px;}
-.stage{ background:#3A0E0E;border:1px solid #7A2E2E;border-radius:7px; padding:6px 8px;min-width:120px;text-align:center;font-weight:900; color:#FEE2E2; font-size:12px; transition:all .15s ease-in-out; }
-.stage.active{ box-shadow:0 0 0 3px var(--brand-coral) inset; transform:translateY(-2px); }
-.connector{height:2px;background:#7A2E2E;position:relative;border-radius:2px;}
-.connector:after{content:"";position:absolute;right:-4px;top:-2px;border-left:6px solid #7A2E2E;border-top:4px solid transparent;border-bottom:4px solid transparent;}
-.stepbadge{ width:22px;height:22px;border-radius:50%;border:2px dashed #CBD5E1;display:flex;align-items:center;justify-content:center; color:#E2E8F0;font-weight:900;background:#0B1426;margin:0 auto 3px; font-size:10px; }
-
-/* Charts layout */
-.donutwrap{display:flex;align-items:center;justify-content:flex-end; width:100%;}
-.gaugewrap{display:flex;align-items:center;justify-content:center;}
-
-/* Compact gauge for top - smaller */
-.risk-gauge-wrap{display:flex;align-items:center;justify-content:center; padding:2px 0; transform:scale(0.85);}
-
-/* Pill - more compact */
-.pillbar{ height:36px;border-radius:999px;background:linear-gradient(90deg, #ef4444 0%, #fb923c 40%, #22c55e 100%); display:flex;align-items:center;justify-content:center;border:1px solid #1f2e4a; }
-.pillbar .chip{background:#FFE680;color:#111;border:2px solid #d8b84f;border-radius:18px;padding:4px 10px;font-weight:1000; font-size:12px;}
-.pillcaption{font-weight:1000;text-align:center;margin-top:6px;color:#E2E8F0; font-size:13px;}
-
-/* Compact form elements */
-[data-testid="stSelectbox"], [data-testid="stDateInput"], [data-testid="stNumberInput"], [data-testid="stTextArea"], [data-testid="stToggle"]{margin-bottom:6px !important;}
-label{margin-bottom:3px !important;}
-</style>
-""", unsafe_allow_html=True)
-
-# ======================== SVG HELPERS ========================
-def arc_path(cx, cy, r, start_deg, end_deg):
-    import math as _m
-    start = _m.radians(start_deg); end = _m.radians(end_deg)
-    x1, y1 = cx + r*_m.cos(start), cy + r*_m.sin(start)
-    x2, y2 = cx + r*_m.cos(end),   cy + r*_m.sin(end)
-    large = 1 if end - start > _m.pi else 0
-    return f"M{x1:.3f},{y1:.3f} A{r:.3f},{r:.3f} 0 {large} 1 {x2:.3f},{y2:.3f}"
-
-def semi_gauge_svg(pct:int=70, compact:bool=False)->str:
-    pct = max(0, min(100, pct))
-    if compact:
-        # Smaller gauge for top display - matching image
-        cx, cy, R, stroke = 100, 90, 65, 16
-        filled = 180 * pct/100.0
-        end_angle = 180 - filled
-        base = arc_path(cx, cy, R, 180, 0)
-        fill = arc_path(cx, cy, R, 180, end_angle)
-        return f"""
-        <svg width="220" height="150" viewBox="0 0 220 150">
-          <g fill="none" stroke-linecap="round">
-            <path d="{base}" stroke="#E9B98A" stroke-width="{stroke}" />
-            <path d="{fill}" stroke="#F97362" stroke-width="{stroke}" />
-          </g>
-          <circle cx="{cx}" cy="{cy}" r="{R-12}" fill="#0B1426"/>
-          <text x="{cx}" y="{cy-1}" text-anchor="middle" font-size="38" font-weight="1000" fill="#F8FAFC">{pct}%</text>
-        </svg>
-        """
-    else:
-        cx, cy, R, stroke = 140, 130, 100, 26
-        filled = 180 * pct/100.0
-        end_angle = 180 - filled
-        base = arc_path(cx, cy, R, 180, 0)
-        fill = arc_path(cx, cy, R, 180, end_angle)
-        return f"""
-        <svg width="340" height="240" viewBox="0 0 340 240">
-          <g fill="none" stroke-linecap="round">
-            <path d="{base}" stroke="#E9B98A" stroke-width="{stroke}" />
-            <path d="{fill}" stroke="#F97362" stroke-width="{stroke}" />
-          </g>
-          <circle cx="{cx}" cy="{cy}" r="{R-19}" fill="#0B1426"/>
-          <text x="{cx}" y="{cy-3}" text-anchor="middle" font-size="62" font-weight="1000" fill="#F8FAFC">{pct}%</text>
-        </svg>
-        """
-
-def bar_svg(counts)->str:
-    W, H = 320, 190
-    ymax = max(18, max(counts)+2)
-    labels = [("Downs", counts[0], "var(--bar1)"),
-              ("Turner", counts[1], "var(--bar2)"),
-              ("DiGeorge", counts[2], "var(--bar3)"),
-              ("Williams", counts[3], "var(--bar4)")]
-    barw, gap, x0, y0 = 48, 28, 38, H-32
-    svg = [f'<svg width="{W}" height="{H}" viewBox="0 0 {W} {H}">']
-    svg += [f'<line x1="{x0-14}" y1="24" x2="{x0-14}" y2="{y0}" stroke="#E5E7EB" stroke-width="2"/>',
-            f'<line x1="{x0-14}" y1="{y0}" x2="{W-18}" y2="{y0}" stroke="#E5E7EB" stroke-width="2"/>']
-    x = x0
-    for label, val, color in labels:
-        height = int((val / ymax) * (y0-28))
-        svg.append(f'<rect x="{x}" y="{y0-height}" width="{barw}" height="{height}" rx="8" fill="{color}"/>')
-        svg.append(f'<text x="{x+barw/2}" y="{y0+18}" text-anchor="middle" font-size="12" fill="#F8FAFC" font-weight="900">{label}</text>')
-        x += barw + gap
-    svg.append("</svg>")
-    return "".join(svg)
-
-def donut_svg(segments)->str:
-    cx, cy, R, stroke = 150, 140, 84, 36  # cx pushed right so donut isn't clipped
-    start = -90
-    svg = [f'<svg width="340" height="280" viewBox="0 0 340 280"><g fill="none" stroke-linecap="butt">']
-    for label, pct, color in segments:
-        sweep = 360*pct/100.0; end = start + sweep
-        path = arc_path(cx, cy, R, start, end)
-        svg.append(f'<path d="{path}" stroke="{color}" stroke-width="{stroke}"/>')
-        import math as _m
-        mid = _m.radians((start+end)/2.0)
-        rx = (R+38)*_m.cos(mid) + cx; ry = (R+38)*_m.sin(mid) + cy
-        svg.append(f'<text x="{rx:.1f}" y="{ry:.1f}" text-anchor="middle" font-size="12" fill="#F8FAFC" font-weight="900">{label}</text>')
-        svg.append(f'<text x="{rx:.1f}" y="{ry+14:.1f}" text-anchor="middle" font-size="12" fill="#F8FAFC">{pct:.0f}%</text>')
-        start = end
-    svg.append('</g><circle cx="{cx}" cy="{cy}" r="{r}" fill="#0B1426"/></svg>'.format(cx=cx, cy=cy, r=R-24))
-    return "".join(svg)
+with perf.section("css"):
+    perf.markdown(THEME_CSS)
 
 # ======================== SESSION DEFAULTS ========================
 ss = st.session_state
@@ -194,73 +41,105 @@ defaults = dict(
     gest_days=0,
     is_premature=False,  # Premature toggle
     base_risk=70,  # Base risk percentage
+    date_of_surg=date(2025,10,18),
+    age_months=0,
+    age_days=0,
+    weight_kg=5.0,
+    bmi_cat="Underweight",
+    cpb_time=0,
+    tapvr="No",
+    genetic="No abnormality",
+    shunt_mm="3.5 mm",
 )
 for k,v in defaults.items():
     ss.setdefault(k, v)
 
-# ======================== CONTROLS (Interactive) ========================
+# ======================== PATIENT STORE ========================
+# Optional columnar store (generate one with `python patients.py 20000 data/patients`).
+STORE_PATH = os.environ.get("PATIENT_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "patients"))
+
+@st.cache_resource(on_release=lambda shared: shared is not None and shared.close())
+def load_shared(path):
+    # One per process: every session reads the same snapshot; edits go to the store's edit log.
+    return SharedCohort(path) if os.path.isdir(path) else None
+
+shared = load_shared(STORE_PATH)
+view = ss.cohort_view = shared.session(ss.get("cohort_view")) if shared is not None else None
+store = view.snapshot.store if view is not None else None
+NEIGHBOURS_K = 50  # comparable patients behind the SHUNT:WEIGHT pill
+WALL_COLS = 10     # gauges per row strip on the unit wall
+WALL_REFRESH_S = float(os.environ.get("WALL_REFRESH_S", "10"))
+# Row strips per wall element. Streamlit sends an element the browser already holds as a
+# short reference once it reaches global.minCachedMessageSize, so blocks at least that big
+# (sized from the smallest possible row) make a refresh re-send only blocks whose tiles changed.
+WALL_BLOCK_ROWS = -(-int(st.get_option("global.minCachedMessageSize"))
+                    // len(wall_row_svg((("0", 0),) * WALL_COLS, WALL_COLS)))
+
+@st.cache_data(ttl=300)
+def cohort_ranking(path, version, commits, _snapshot, k):
+    # Whole-unit re-rank, recomputed at most every 5 minutes or when the store or a committed edit changes it.
+    scores = _snapshot.scores()
+    rows = top_k(scores, k)
+    ids = _snapshot.store.column("patient_id")
+    return dict(patient_id=[str(ids[r]) for r in rows], risk=[int(scores[r]) for r in rows])
+
+def load_patient(patient_id):
+    rec = view.get(patient_id) if view is not None else None
+    if rec is None:
+        return False
+    for k,v in rec.items():
+        ss[k] = v
+    ss.loaded_patient = rec["patient_id"]
+    ss.sync_wt = False
+    # keyed widgets hold their own state; drop it so they pick up the new patient
+    for key in ("base_risk_slider", "premature_check"):
+        ss.pop(key, None)
+    return True
+
+def save_edits():
+    # Record the loaded patient's edits: logged (and shared once committed) when the store has
+    # an edit log, else kept in this session's overlay.
+    if view is None or ss.patient_id != ss.get("loaded_patient"):
+        return
+    view.edit({k: ss[k] for k in SCHEMA})
+
+if store is not None and len(store) and "loaded_patient" not in ss:
+    if not load_patient(ss.patient_id):
+        load_patient(store.column("patient_id")[0])
+
+# ======================== VITALS STREAM ========================
+# Optional post-op vitals feed: a file path or tcp://host:port (see vitals.py).
+VITALS_SOURCE = os.environ.get("VITALS_SOURCE")
+VITALS_REFRESH_S = float(os.environ.get("VITALS_REFRESH_S", "2"))
+
+@st.cache_resource
+def load_vitals(source):
+    # One reader per process; every session draws from the same ring buffers.
+    return open_vitals(source)
+
+vitals_hub = load_vitals(VITALS_SOURCE) if VITALS_SOURCE else None
+
+# ======================== LAYOUT ========================
+# The skeleton is laid out first. Each section below fills its own slots, and the
+# widgets that drive a section live inside its fragment, so changing one reruns
+# only that section instead of the whole script.
+# Keyed fragments (st.fragment(key=...), rerun by name with st.rerun([keys])) are newer than
+# st.fragment itself, so look for the parameter rather than trusting a version number.
+KEYED_FRAGMENTS = hasattr(st, "fragment") and "key" in inspect.signature(st.fragment).parameters
+
+def fragment(func=None, *, key=None):
+    # st.fragment; keyed ones can also be rerun by name from a widget callback. Plain functions,
+    # so full reruns, without st.fragment, and keyed ones too where Streamlit can't key them.
+    if not hasattr(st, "fragment") or (key is not None and not KEYED_FRAGMENTS):
+        return func if func is not None else (lambda f: f)
+    return st.fragment(func, key=key) if KEYED_FRAGMENTS else st.fragment(func)
+
 with st.expander("⚙️  Controls", expanded=False):
-    tabs = st.tabs(["Visual Controls", "Patient Data"])
+    tabs = st.tabs(["Visual Controls", "Patient Data", "Cohort"])
     with tabs[0]:
-        c1, c2, c3 = st.columns([0.33, 0.37, 0.30])
-        with c1:
-            ss.base_risk = st.slider("Base Risk %", 0, 100, int(ss.base_risk), 1, key="base_risk_slider")
-            ss.is_premature = st.checkbox("Premature", value=ss.is_premature, key="premature_check")
-            # Calculate risk: if premature, add 15% risk
-            risk_pct = min(100, int(ss.base_risk) + (15 if ss.is_premature else 0))
-        with c2:
-            st.caption("Genetic Abnormalities (counts)")
-            d = st.slider("Downs", 0, 30, 12, 1)
-            t = st.slider("Turner", 0, 30, 10, 1)
-            g = st.slider("DiGeorge", 0, 30, 16, 1)
-            w = st.slider("Williams", 0, 30, 13, 1)
-            counts = [d, t, g, w]
-        with c3:
-            st.caption("Shunt Size Distribution (raw numbers; auto-normalized)")
-            s50 = st.number_input("5.0 mm", min_value=0.0, value=10.0, step=1.0)
-            s40 = st.number_input("4.0 mm", min_value=0.0, value=18.0, step=1.0)
-            s35 = st.number_input("3.5 mm", min_value=0.0, value=25.0, step=1.0)
-            s30 = st.number_input("3.0 mm", min_value=0.0, value=47.0, step=1.0)
-            raw_total = max(1.0, s50+s40+s35+s30)
-            shunt_pcts = [round(100*s50/raw_total,1),
-                          round(100*s40/raw_total,1),
-                          round(100*s35/raw_total,1),
-                          round(100*s30/raw_total,1)]
-            st.caption(f"Normalized to 100% → {sum(shunt_pcts):.1f}%")
-        st.caption("Highlight a complication (emphasizes stage)")
-        hl = st.selectbox("", ["(none)","Cardiac Arrest","Reoperation Bleed","Sepsis","Chylothorax Intervention","Stroke","Sudden Hypoxemia"], index=0)
-
-    with tabs[1]:
-        st.subheader("Patient Header")
-        a, b, c, dcol = st.columns([0.22, 0.20, 0.18, 0.40])
-        with a:
-            ss.patient_id = st.text_input("Patient ID", ss.patient_id)
-            ss.gender     = st.selectbox("Gender", ["F","M","Intersex","Other"], index=["F","M","Intersex","Other"].index(ss.gender))
-        with b:
-            ss.dob        = st.date_input("DOB", value=ss.dob)
-            ss.weight_current = st.number_input("Weight (kg)", min_value=0.0, value=float(ss.weight_current), step=0.1)
-        with c:
-            ss.race_eth   = st.text_input("Race/Ethnicity", ss.race_eth)
-            ss.gest_weeks = st.number_input("Gest Age (weeks)", min_value=0, max_value=45, value=int(ss.gest_weeks))
-            ss.gest_days  = st.number_input("Gest Age (days)",   min_value=0, max_value=6,  value=int(ss.gest_days))
-        with dcol:
-            st.info("Values here update the **top band** immediately. Use the Surgical section below for procedure-specific inputs. You can also sync current weight to 'Weight at Surgery'.")
-
-        st.subheader("Surgical Inputs")
-        left, right = st.columns(2)
-        with left:
-            date_of_surg = st.date_input("Date of Surgery", value=date(2025,10,18))
-            age_months  = st.number_input("Age at Surgery (months)", min_value=0, max_value=60, value=0)
-            age_days    = st.number_input("Age at Surgery (days)", min_value=0, max_value=31, value=0)
-            sync_wt = st.checkbox("Use current Weight for 'Weight at Surgery'", value=True)
-        with right:
-            weight_kg   = st.number_input("Weight at Surgery (kg)", min_value=0.0, max_value=200.0,
-                                          value=float(ss.weight_current) if sync_wt else 5.0, step=0.1)
-            bmi_cat     = st.selectbox("Body Mass Index", ["Underweight","Normal","Overweight","Obese"], index=0)
-            cpb_time    = st.number_input("CPB Time (minutes)", min_value=0, max_value=1000, value=0)
-            tapvr       = st.selectbox("Concurrent TAPVR Repair", ["No","Yes"], index=0)
+        ctl_risk, ctl_genetic, ctl_shunt = st.columns([0.33, 0.37, 0.30])
+        ctl_flow = st.container()
 
-# ======================== LAYOUT ========================
 nav, main = st.columns([0.20, 0.80], gap="small")
 
 with nav:
@@ -268,48 +147,8 @@ with nav:
 
 with main:
     # ================= RISK SECTION AT TOP - MAIN ATTRACTION =================
-    premature_class = "hidden" if not ss.is_premature else ""
-    st.markdown(f"""
-    <div class="risk-header">
-      <div class="risk-title">⚠️ PATIENT RISK ASSESSMENT ⚠️</div>
-      <div class="risk-display">
-        <div>
-          <div class="risk-percentage">{risk_pct}%</div>
-          <div class="risk-label">RISK LEVEL</div>
-        </div>
-        <div class="risk-gauge-wrap">
-          {semi_gauge_svg(risk_pct, compact=True)}
-        </div>
-        <div>
-          <div class="risk-percentage" style="font-size:32px;">{risk_pct}</div>
-          <div class="risk-label">/ 100</div>
-        </div>
-      </div>
-      <div class="risk-toggle-container">
-        <label style="font-size:12px; font-weight:700; color:var(--muted);">Premature Status:</label>
-        <span style="font-size:13px; font-weight:900; color:{'#F97362' if ss.is_premature else '#C7D2FE'};">
-          {'✓ PREMATURE (+15% risk)' if ss.is_premature else 'Not Premature'}
-        </span>
-      </div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # --- Top band (uses session values) with conditional premature icon ---
-    gest_label = f"{int(ss.gest_weeks)} weeks {int(ss.gest_days)} days"
-    st.markdown(f"""
-    <div class="topband">
-      <div class="premature-icon {premature_class}">👶</div>
-      <div class="kvgrid">
-        <div class="kv"><div class="label">PATIENT&nbsp;ID</div><div class="val muted">{ss.patient_id}</div></div>
-        <div class="kv"><div class="label">DOB</div><div class="val muted">{ss.dob.strftime("%m/%d/%Y")}</div></div>
-        <div class="kv"><div class="label">GENDER</div><div class="val muted">{ss.gender}</div></div>
-        <div class="kv"><div class="label">RACE/ETHNICITY</div><div class="val muted">{ss.race_eth}</div></div>
-        <div class="kv"><div class="label">WEIGHT</div><div class="val muted">{ss.weight_current:.1f} kg</div></div>
-        <div class="kv"><div class="label">GEST&nbsp;AGE</div><div class="val muted">{gest_label}</div></div>
-        <div class="baby">👶</div>
-      </div>
-    </div>
-    """, unsafe_allow_html=True)
+    risk_slot = st.container()
+    band_slot = st.container()
 
     # Row 1: left text (dynamic from inputs), middle bars, right removed (risk moved to top)
     c1, c2 = st.columns([0.60, 0.40], gap="large")
@@ -319,21 +158,11 @@ with main:
         st.markdown('<div class="muted">short summary of diagnosis</div>', unsafe_allow_html=True)
 
         st.markdown('<div class="h2" style="margin-top:8px;">SURGICAL&nbsp;PROCEDURE</div>', unsafe_allow_html=True)
-        st.markdown(f"""
-        <div class="muted" style="font-size:13px;">Systemic-to-Pulmonary Shunt Placement</div>
-        <div style="margin-top:4px; font-size:12px; line-height:1.6;">
-          <b>DATE OF SURG:</b> {date_of_surg.strftime("%m/%d/%Y")}<br>
-          <b>AGE AT SURGERY:</b> {age_months} months {age_days} days<br>
-          <b>WEIGHT AT SURGERY:</b> {weight_kg:.1f} kg<br>
-          <b>BODY MASS INDEX:</b> {bmi_cat}<br>
-          <b>CPB TIME:</b> {cpb_time} minutes<br>
-          <b>CONCURRENT TAPVR REPAIR:</b> {tapvr}
-        </div>
-        """, unsafe_allow_html=True)
+        surgical_slot = st.container()
 
     with c2:
         st.markdown('<div class="h2">GENETIC&nbsp;ABNORMALITIES</div>', unsafe_allow_html=True)
-        st.markdown(bar_svg([d,t,g,w]), unsafe_allow_html=True)
+        bar_slot = st.container()
 
     st.markdown("<hr style='border:none;height:6px;background:transparent;'>", unsafe_allow_html=True)
 
@@ -342,41 +171,278 @@ with main:
 
     with c4:
         st.markdown('<div class="h3">POST&nbsp;OPERATIVE&nbsp;COMPLICATIONS (STEPS&nbsp;1–6)</div>', unsafe_allow_html=True)
-        def klass(name): return "stage active" if st.session_state.get('hl', None) == name else ("stage active" if False else "stage")
-
-        # we still have a separate selector above; highlight logic retained
-        def act(name): 
-            return "stage active" if name == st.session_state.get('hl_sel', '') else "stage"
-
-        # Row 1: Steps 1–3
-        st.markdown(f"""
-        <div class="flowgrid">
-          <div><div class="stepbadge">1</div><div class="stage">Cardiac<br>Arrest</div></div>
-          <div class="connector"></div>
-          <div><div class="stepbadge">2</div><div class="stage">Reoperation<br>Bleed</div></div>
-          <div class="connector"></div>
-          <div><div class="stepbadge">3</div><div class="stage">Sepsis</div></div>
-        </div>
-        """, unsafe_allow_html=True)
-        # Row 2: Steps 4–6
-        st.markdown(f"""
-        <div class="flowgrid" style="margin-top:4px;">
-          <div><div class="stepbadge">4</div><div class="stage">Chylothorax<br>Intervention</div></div>
-          <div class="connector"></div>
-          <div><div class="stepbadge">5</div><div class="stage">Stroke</div></div>
-          <div class="connector"></div>
-          <div><div class="stepbadge">6</div><div class="stage">Sudden<br>Hypoxemia</div></div>
-        </div>
-        """, unsafe_allow_html=True)
+        flow_slot = st.container()
 
     with c5:
         st.markdown('<div class="h2" style="text-align:center;">SHUNT&nbsp;SIZE</div>', unsafe_allow_html=True)
-        segments = [("5.0 mm", shunt_pcts[0], "var(--donut1)"),
-                    ("4.0 mm", shunt_pcts[1], "var(--donut2)"),
-                    ("3.5 mm", shunt_pcts[2], "var(--donut3)"),
-                    ("3.0 mm", shunt_pcts[3], "var(--donut4)")]
-        st.markdown(f'<div class="donutwrap">{donut_svg(segments)}</div>', unsafe_allow_html=True)
+        donut_slot = st.container()
 
         st.markdown('<div class="h2" style="margin-top:6px; text-align:center;">SHUNT:WEIGHT</div>', unsafe_allow_html=True)
-        st.markdown('<div class="pillbar"><span class="chip">PATIENT XYZ</span></div>', unsafe_allow_html=True)
-        st.markdown('<div class="pillcaption">3.5 MM: 5 KG</div>', unsafe_allow_html=True)
+        pill_slot = st.container()
+
+    if vitals_hub is not None:
+        st.markdown('<div class="h3" style="margin-top:8px;">POST&nbsp;OPERATIVE&nbsp;VITALS (72&nbsp;H)</div>', unsafe_allow_html=True)
+        vitals_slot = st.container()
+
+# ======================== PATIENT DATA (full rerun) ========================
+# Patient edits feed almost every section, so they rerun the whole script.
+with tabs[1]:
+    st.subheader("Patient Header")
+    a, b, c, dcol = st.columns([0.22, 0.20, 0.18, 0.40])
+    with a:
+        ss.patient_id = st.text_input("Patient ID", ss.patient_id)
+        if store is not None and ss.patient_id != ss.get("loaded_patient"):
+            if load_patient(ss.patient_id):
+                st.rerun()
+            st.caption(f"Patient ID not in store ({len(store):,} patients); editing locally.")
+        ss.gender     = st.selectbox("Gender", GENDERS, index=GENDERS.index(ss.gender))
+    with b:
+        ss.dob        = st.date_input("DOB", value=ss.dob)
+        ss.weight_current = st.number_input("Weight (kg)", min_value=0.0, value=float(ss.weight_current), step=0.1)
+    with c:
+        ss.race_eth   = st.text_input("Race/Ethnicity", ss.race_eth)
+        ss.gest_weeks = st.number_input("Gest Age (weeks)", min_value=0, max_value=45, value=int(ss.gest_weeks))
+        ss.gest_days  = st.number_input("Gest Age (days)",   min_value=0, max_value=6,  value=int(ss.gest_days))
+    with dcol:
+        st.info("Values here update the **top band** immediately. Use the Surgical section below for procedure-specific inputs. You can also sync current weight to 'Weight at Surgery'.")
+
+    st.subheader("Surgical Inputs")
+    left, right = st.columns(2)
+    with left:
+        ss.date_of_surg = st.date_input("Date of Surgery", value=ss.date_of_surg)
+        ss.age_months  = st.number_input("Age at Surgery (months)", min_value=0, max_value=60, value=int(ss.age_months))
+        ss.age_days    = st.number_input("Age at Surgery (days)", min_value=0, max_value=31, value=int(ss.age_days))
+        ss.sync_wt = st.checkbox("Use current Weight for 'Weight at Surgery'", value=ss.get("sync_wt", True))
+    with right:
+        ss.weight_kg   = st.number_input("Weight at Surgery (kg)", min_value=0.0, max_value=200.0,
+                                         value=float(ss.weight_current) if ss.sync_wt else float(ss.weight_kg), step=0.1)
+        ss.bmi_cat     = st.selectbox("Body Mass Index", BMI_CATS, index=BMI_CATS.index(ss.bmi_cat))
+        ss.cpb_time    = st.number_input("CPB Time (minutes)", min_value=0, max_value=1000, value=int(ss.cpb_time))
+        ss.tapvr       = st.selectbox("Concurrent TAPVR Repair", TAPVR, index=TAPVR.index(ss.tapvr))
+        ss.genetic     = st.selectbox("Genetic Abnormality", GENETIC, index=GENETIC.index(ss.genetic))
+        ss.shunt_mm    = st.selectbox("Shunt Size", SHUNT_SIZES, index=SHUNT_SIZES.index(ss.shunt_mm))
+
+    save_edits()
+    log = shared.edits.stats() if shared is not None and shared.edits is not None else None
+    if log is not None and log["error"]:
+        st.warning(f"Edits are not being saved to disk yet ({log['pending']} pending): {log['error']}. "
+                   "They are kept and retried.")
+
+    events = view.snapshot.events if view is not None else None
+    if events is not None and ss.patient_id == ss.get("loaded_patient"):
+        st.subheader("Post-op Complications")
+        history = events.patient_events(ss.patient_id)
+        st.caption(" → ".join(f"{name} ({ts.astype(date).strftime('%m/%d/%Y')})" for name, ts in history)
+                   if history else "No complications recorded.")
+        e1, e2 = st.columns([0.7, 0.3])
+        new_stage = e1.selectbox("Complication", STAGES, key="new_event_stage")
+        if e2.button("Record now", key="new_event_add"):
+            try:
+                events.add(ss.patient_id, new_stage, np.datetime64("now", "s"))
+            except OSError as e:
+                st.error(f"Could not save the complication: {e}")
+            else:
+                st.rerun()
+
+with tabs[2]:
+    if store is None:
+        st.info("No patient store loaded. Generate one with `python patients.py 20000 data/patients`.")
+    else:
+        st.subheader("Highest-risk patients")
+        top = cohort_ranking(STORE_PATH, view.snapshot.version, view.snapshot.commits, view.snapshot, 15)
+        st.caption(f"Ranked {len(store):,} patients")
+        st.dataframe(top, hide_index=True, width="stretch")
+        st.toggle("Unit wall (one mini gauge per bed)", key="wall_on")
+        wall_slot = st.container()
+
+with surgical_slot, perf.section("surgical"):
+    perf.markdown(surgical_html(ss))
+
+# ======================== SECTIONS (fragments) ========================
+def premature_changed():
+    # Prematurity also picks the patient's cohort bucket, so save it now and rerun the
+    # cohort charts along with this section.
+    ss.is_premature = ss.premature_check
+    save_edits()
+    if view is not None and KEYED_FRAGMENTS:
+        st.rerun(["risk", "cohort"])
+
+@fragment(key="risk")
+def risk_section():
+    # Base Risk / Premature -> risk header, the top band's premature icon and the
+    # shunt:weight pill (prematurity is one of the comparison features)
+    with ctl_risk:
+        ss.base_risk = st.slider("Base Risk %", 0, 100, int(ss.base_risk), 1, key="base_risk_slider")
+        ss.is_premature = st.checkbox("Premature", value=ss.is_premature, key="premature_check",
+                                      on_change=premature_changed)
+    save_edits()
+    risk_pct = score_patient(ss.base_risk, ss.is_premature, ss.weight_kg, ss.cpb_time, ss.tapvr, ss.bmi_cat)
+    with risk_slot, perf.section("risk_header"):
+        perf.markdown(risk_header_html(risk_pct, ss.is_premature, DEFAULT_COEFFICIENTS["premature"]))
+    with band_slot, perf.section("top_band"):
+        perf.markdown(topband_html(ss))
+    with pill_slot, perf.section("pill"):
+        if view is None:
+            perf.markdown(pill_html())
+        else:
+            rec = {k: ss[k] for k in SCHEMA}
+            _, shunts, weights, _ = view.snapshot.neighbours.query(rec, NEIGHBOURS_K)
+            perf.markdown(pill_html(rec, shunt_summary(rec, shunts, weights)))
+
+@fragment
+def genetic_section():
+    with ctl_genetic:
+        st.caption("Genetic Abnormalities (counts)")
+        d = st.slider("Downs", 0, 30, 12, 1)
+        t = st.slider("Turner", 0, 30, 10, 1)
+        g = st.slider("DiGeorge", 0, 30, 16, 1)
+        w = st.slider("Williams", 0, 30, 13, 1)
+    with bar_slot, perf.section("bar"):
+        perf.markdown(bar_svg([d, t, g, w]))
+
+@fragment
+def shunt_section():
+    with ctl_shunt:
+        st.caption("Shunt Size Distribution (raw numbers; auto-normalized)")
+        s50 = st.number_input("5.0 mm", min_value=0.0, value=10.0, step=1.0)
+        s40 = st.number_input("4.0 mm", min_value=0.0, value=18.0, step=1.0)
+        s35 = st.number_input("3.5 mm", min_value=0.0, value=25.0, step=1.0)
+        s30 = st.number_input("3.0 mm", min_value=0.0, value=47.0, step=1.0)
+        raw_total = max(1.0, s50+s40+s35+s30)
+        shunt_pcts = [round(100*s50/raw_total,1),
+                      round(100*s40/raw_total,1),
+                      round(100*s35/raw_total,1),
+                      round(100*s30/raw_total,1)]
+        st.caption(f"Normalized to 100% → {sum(shunt_pcts):.1f}%")
+    with donut_slot, perf.section("donut"):
+        perf.markdown(f'<div class="donutwrap">{donut_svg(donut_segments(shunt_pcts))}</div>')
+
+@fragment(key="cohort")
+def cohort_section():
+    # With a patient store both charts are counted from it, under shared filters
+    with ctl_genetic:
+        st.caption("Cohort filters (charts count stored patients)")
+        f_genders = st.multiselect("Gender", GENDERS, default=GENDERS, key="f_genders")
+        f_prem = st.selectbox("Prematurity", ["Any", "Premature", "Term"], key="f_prem")
+        f_dates = st.date_input("Surgery date range", value=(), key="f_dates")
+    with ctl_shunt:
+        st.caption("Genetic Abnormalities and Shunt Size Distribution are counted from the patient store.")
+    counts, shunt_counts = view.counts(
+        genders=None if len(f_genders) == len(GENDERS) else f_genders,
+        premature=None if f_prem == "Any" else f_prem == "Premature",
+        date_from=f_dates[0] if len(f_dates) > 0 else None,
+        date_to=f_dates[1] if len(f_dates) > 1 else None)
+    with bar_slot, perf.section("bar"):
+        perf.markdown(bar_svg(counts))
+    with donut_slot, perf.section("donut"):
+        perf.markdown(f'<div class="donutwrap">{donut_svg(donut_segments(shunt_percentages(shunt_counts)))}</div>')
+
+@fragment
+def flow_section():
+    # Highlight a stage; with an event log, also who went from it to another stage recently
+    events = view.snapshot.events if view is not None else None
+    with ctl_flow:
+        st.caption("Highlight a complication (emphasizes stage)")
+        hl = st.selectbox("Highlight a complication", ["(none)"] + STAGES, index=0, key="hl",
+                          label_visibility="collapsed")
+        if events is not None and hl != "(none)":
+            q1, q2 = st.columns(2)
+            nxt = q1.selectbox("Followed by", STAGES, index=STAGES.index("Stroke"), key="hl_next")
+            days = q2.number_input("Within the last (days)", min_value=1, max_value=3650, value=30, key="hl_days")
+    highlight = None if hl == "(none)" else hl
+    with flow_slot, perf.section("flow"):
+        if events is None:
+            perf.markdown(flow_html(highlight=highlight))
+            return
+        perf.markdown(flow_html(events.stage_counts(), events.transition_probabilities(), highlight,
+                                events.patient_stages(ss.patient_id)))
+        if highlight is not None:
+            until = np.datetime64("now", "s")
+            pids = events.transition_patients(highlight, nxt, until - np.timedelta64(int(days), "D"), until)
+            shown = ", ".join(pids[:8].tolist()) + (" …" if len(pids) > 8 else "")
+            perf.markdown(f'<div class="muted" style="font-size:12px; margin-top:6px;">'
+                          f'<b>{len(pids):,}</b> patients went {highlight} → {nxt} in the last {int(days)} days'
+                          f'{": " + shown if len(pids) else ""}</div>')
+
+def wall_section():
+    # The highest-risk `beds` patients as a paginated grid of mini gauges. Each patient keeps
+    # their slot for as long as they stay on the wall and a newcomer takes the slot someone
+    # left, so a refresh changes only the tiles whose patient or score changed. Row strips are
+    # memoized and sent in fixed blocks of WALL_BLOCK_ROWS, so only blocks holding a changed
+    # tile are re-sent.
+    with wall_slot:
+        w1, w2, w3 = st.columns(3)
+        beds = w1.selectbox("Beds", [100, 300, 600], index=1, key="wall_beds")
+        per_page = w2.selectbox("Tiles per page", [60, 120, 300], key="wall_page_size")
+        page = w3.number_input("Page", min_value=1, max_value=max(1, -(-beds // per_page)), value=1, key="wall_page")
+        with perf.section("wall"):
+            scores = view.snapshot.scores()
+            ids = store.column("patient_id")
+            ss.wall_slots = stable_slots(ss.get("wall_slots", []), ids[np.sort(top_k(scores, beds))].tolist())
+            tiles = [(pid, scores[store.row_of(pid)]) for pid in ss.wall_slots[(page - 1) * per_page:page * per_page]]
+            perf.markdown(wall_defs_svg())
+            block = WALL_BLOCK_ROWS * WALL_COLS
+            for i in range(0, len(tiles), block):
+                perf.markdown("".join(wall_row_svg(tiles[j:j + WALL_COLS], WALL_COLS)
+                                      for j in range(i, min(i + block, len(tiles)), WALL_COLS)))
+
+def vitals_section():
+    # Reruns on its own timer; the hub has already folded new samples into the downsampled series.
+    with vitals_slot, perf.section("vitals"):
+        window = vitals_hub.window(ss.patient_id)
+        if window is None:
+            perf.markdown('<div class="muted">No vitals stream for this patient.</div>')
+        else:
+            t, v, _ = window
+            perf.markdown(f'<div class="card">{vitals_svg(t, v, float(t[-1].max()), vitals_hub.span_s)}</div>')
+        if vitals_hub.error:
+            st.caption(f"Vitals feed: {vitals_hub.errors} failed batch(es) dropped; last: {vitals_hub.error}")
+
+if vitals_hub is not None and hasattr(st, "fragment"):
+    vitals_section = st.fragment(run_every=VITALS_REFRESH_S)(vitals_section)
+if hasattr(st, "fragment"):
+    wall_section = st.fragment(run_every=WALL_REFRESH_S)(wall_section)
+
+risk_section()
+if view is None:
+    genetic_section()
+    shunt_section()
+else:
+    cohort_section()
+flow_section()
+if vitals_hub is not None:
+    vitals_section()
+if store is not None and ss.get("wall_on"):
+    wall_section()
+
+# ======================== DIAGNOSTICS (opt-in) ========================
+@fragment
+def diagnostics_panel():
+    with st.expander("🩺 Diagnostics", expanded=False):
+        st.button("Refresh", key="diag_refresh")
+        metrics = perf.section_metrics()
+        rows = [dict(section=k, ms=round(v["ms"], 2), bytes=v["bytes"],
+                     cache_hits=v["cache_hits"], cache_misses=v["cache_misses"]) for k, v in metrics.items()]
+        st.dataframe(rows, hide_index=True, width="stretch")
+        cache = charts.cache_stats()
+        st.caption(f"Last rerun: {sum(v['ms'] for v in metrics.values()):.1f} ms, "
+                   f"{sum(v['bytes'] for v in metrics.values()):,} bytes · SVG cache "
+                   f"{cache['hit_rate']:.0%} hits ({cache['size']}/{cache['maxsize']} entries)")
+        if shared is not None:
+            mem = shared.memory_usage()
+            st.caption(f"Shared cohort: {mem['patients']:,} patients, {mem['snapshots']} snapshot(s), "
+                       f"{mem['sessions']} session(s) · {mem['mapped'] / 2**20:.1f} MiB mapped, "
+                       f"{mem['heap'] / 2**20:.1f} MiB heap ({mem['edited_patients']} patients with session edits)")
+            if shared.edits is not None:
+                log = shared.edits.stats()
+                st.caption(f"Edit log: {log['patients']:,} edited patients, {log['written']:,} edits written in "
+                           f"{log['commits']:,} commits ({log['edits_per_commit']:.1f} per commit), "
+                           f"{log['pending']} pending · replayed {log['replayed']:,} rows in {log['replay_ms']:.0f} ms")
+                if log["error"]:
+                    st.caption(f"Edit log writes failing ({log['errors']} errors so far): {log['error']}")
+        d1, d2 = st.columns(2)
+        d1.download_button("Prometheus metrics", perf.prometheus_text(), "dashboard_metrics.prom", "text/plain")
+        d2.download_button("Section log (JSONL)", perf.jsonl_snapshot(), "dashboard_sections.jsonl", "application/json")
+
+if perf.enabled():
+    diagnostics_panel()
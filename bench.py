@@ -0,0 +1,201 @@
+# bench.py
+# Headless render benchmarks for app.py, driven through streamlit's AppTest.
+#
+#   python bench.py --out baseline.json                  # record a baseline
+#   python bench.py --compare baseline.json              # fail on regressions
+#   python bench.py --sizes 1,1000,50000 --repeat 5
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import charts
+import perf
+from patients import demo_columns, write_store
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+DEFAULT_SIZES = [1, 100, 1000, 10000, 50000]
+
+# ======================== MEASUREMENT ========================
+def payload_bytes(at)->int:
+    # HTML/SVG bytes the rerun emitted through st.markdown
+    return sum(len(m.value.encode("utf-8")) for m in at.markdown)
+
+def timed_run(at, samples:list):
+    t0 = time.perf_counter()
+    at.run()
+    wall = (time.perf_counter() - t0) * 1000.0
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    sections = at.session_state[perf.SECTIONS_KEY]
+    samples.append(dict(wall_ms=wall, payload_bytes=payload_bytes(at),
+                        sections_ms={k: v["ms"] for k, v in sections.items()},
+                        section_bytes={k: v["bytes"] for k, v in sections.items()}))
+    return at
+
+def new_app():
+    return AppTest.from_file(APP, default_timeout=120)
+
+def cold_app():
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    charts.clear_cache()
+    return new_app()
+
+def summarize(samples:list)->dict:
+    walls = sorted(s["wall_ms"] for s in samples)
+    sections, section_bytes = {}, {}
+    for s in samples:
+        for name, ms in s["sections_ms"].items():
+            sections.setdefault(name, []).append(ms)
+        for name, n in s["section_bytes"].items():
+            section_bytes.setdefault(name, []).append(n)
+    return dict(
+        runs=len(samples),
+        wall_ms=dict(median=statistics.median(walls), p95=walls[int(0.95 * (len(walls) - 1))], max=walls[-1]),
+        payload_bytes=int(statistics.median(s["payload_bytes"] for s in samples)),
+        sections_ms={k: statistics.median(v) for k, v in sorted(sections.items())},
+        section_bytes={k: int(statistics.median(v)) for k, v in sorted(section_bytes.items())},
+    )
+
+# ======================== SCENARIOS ========================
+def number_input(at, label):
+    return next(w for w in at.number_input if w.label == label)
+
+def scenario_cold_start(repeat):
+    samples = []
+    for _ in range(repeat):
+        timed_run(cold_app(), samples)
+    return samples
+
+def scenario_base_risk_sweep(repeat):
+    samples = []
+    at = new_app().run()
+    for _ in range(repeat):
+        for v in range(0, 101, 10):
+            at.slider(key="base_risk_slider").set_value(v)
+            timed_run(at, samples)
+    return samples
+
+def scenario_shunt_edits(repeat):
+    # Manual shunt inputs without a store; the loaded patient's shunt size with one.
+    samples = []
+    at = new_app().run()
+    for i in range(repeat):
+        if os.environ.get("PATIENT_STORE"):
+            for size in ["5.0 mm", "4.0 mm", "3.5 mm", "3.0 mm"]:
+                next(w for w in at.selectbox if w.label == "Shunt Size").set_value(size)
+                timed_run(at, samples)
+        else:
+            for label in ["5.0 mm", "4.0 mm", "3.5 mm", "3.0 mm"]:
+                number_input(at, label).set_value(float(10 + i + len(samples)))
+                timed_run(at, samples)
+    return samples
+
+def scenario_patient_edit(repeat):
+    samples = []
+    at = new_app().run()
+    for i in range(repeat):
+        number_input(at, "Weight (kg)").set_value(round(3.0 + 0.1 * i, 1))
+        timed_run(at, samples)
+        number_input(at, "CPB Time (minutes)").set_value(30 + i)
+        timed_run(at, samples)
+    return samples
+
+def scenario_wall_refresh(repeat):
+    # Unit wall at 300 beds on one page, then timer-style refreshes (plain reruns without a store).
+    samples = []
+    at = new_app().run()
+    walls = [w for w in at.toggle if w.key == "wall_on"]
+    if walls:
+        walls[0].set_value(True)
+        at.run()
+        at.selectbox(key="wall_page_size").set_value(300)
+    for _ in range(repeat * 3):
+        timed_run(at, samples)
+    return samples
+
+SCENARIOS = dict(
+    cold_start=scenario_cold_start,
+    base_risk_sweep=scenario_base_risk_sweep,
+    shunt_edits=scenario_shunt_edits,
+    patient_edit=scenario_patient_edit,
+    wall_refresh=scenario_wall_refresh,
+)
+
+def run_suite(sizes, repeat)->dict:
+    results = {}
+    saved = os.environ.pop("PATIENT_STORE", None)
+    try:
+        for name, fn in SCENARIOS.items():
+            results[name] = summarize(fn(repeat))
+            print(f"{name:<24} {results[name]['wall_ms']['median']:8.1f} ms", file=sys.stderr)
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                path = os.path.join(tmp, f"cohort_{n}")
+                write_store(path, demo_columns(n))
+                os.environ["PATIENT_STORE"] = path
+                for name, fn in SCENARIOS.items():
+                    key = f"cohort_{n}/{name}"
+                    results[key] = summarize(fn(repeat))
+                    print(f"{key:<24} {results[key]['wall_ms']['median']:8.1f} ms", file=sys.stderr)
+    finally:
+        os.environ.pop("PATIENT_STORE", None)
+        if saved is not None:
+            os.environ["PATIENT_STORE"] = saved
+    return dict(
+        meta=dict(python=platform.python_version(), streamlit=st.__version__, platform=platform.platform(),
+                  repeat=repeat, sizes=list(sizes), created=time.strftime("%Y-%m-%dT%H:%M:%S")),
+        results=results,
+    )
+
+# ======================== COMPARISON ========================
+def compare(baseline:dict, current:dict, threshold:float)->list:
+    # Scenarios whose median wall time or payload grew by more than `threshold`.
+    regressions = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        for metric, b, c in [("wall_ms", base["wall_ms"]["median"], cur["wall_ms"]["median"]),
+                             ("payload_bytes", base["payload_bytes"], cur["payload_bytes"])]:
+            if b > 0 and c > b * (1 + threshold):
+                regressions.append(dict(scenario=name, metric=metric, baseline=b, current=c, change=c / b - 1))
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless render benchmarks for the dashboard")
+    ap.add_argument("--out", help="write results JSON here (default: stdout)")
+    ap.add_argument("--compare", metavar="BASELINE", help="baseline JSON to check for regressions")
+    ap.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown, as a fraction (default 0.20)")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="cohort sizes, comma separated")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(",") if n]
+    report = run_suite(sizes, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']:.1f} -> {r['current']:.1f} "
+                  f"(+{100 * r['change']:.0f}%)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# charts.py
+# SVG chart helpers for the dashboard, memoized on their inputs.
+import math
+import threading
+from collections import OrderedDict
+
+# ======================== RENDER CACHE ========================
+class RenderCache:
+    # Bounded LRU keyed on the chart inputs, with hit/miss counters.
+    def __init__(self, maxsize:int=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()  # Streamlit sessions render on separate threads
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+        value = render()
+        with self._lock:
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self)->dict:
+        total = self.hits + self.misses
+        return dict(size=len(self._data), maxsize=self.maxsize, hits=self.hits,
+                    misses=self.misses, hit_rate=(self.hits/total if total else 0.0))
+
+_cache = RenderCache()
+
+def cache_stats()->dict:
+    return _cache.stats()
+
+def clear_cache():
+    _cache.clear()
+
+# ======================== GEOMETRY ========================
+def _point(cx, cy, r, deg):
+    rad = math.radians(deg)
+    return cx + r*math.cos(rad), cy + r*math.sin(rad)
+
+def arc_path(cx, cy, r, start_deg, end_deg):
+    x1, y1 = _point(cx, cy, r, start_deg)
+    x2, y2 = _point(cx, cy, r, end_deg)
+    large = 1 if math.radians(end_deg) - math.radians(start_deg) > math.pi else 0
+    return f"M{x1:.3f},{y1:.3f} A{r:.3f},{r:.3f} 0 {large} 1 {x2:.3f},{y2:.3f}"
+
+# (cx, cy, R, stroke) for each gauge size
+GAUGE_GEOMETRY = {True: (100, 90, 65, 16), False: (140, 130, 100, 26)}
+
+# Gauge arcs for every integer percentage, computed once at import.
+_GAUGE_BASE = {compact: arc_path(cx, cy, R, 180, 0)
+               for compact, (cx, cy, R, _) in GAUGE_GEOMETRY.items()}
+_GAUGE_FILL = {compact: tuple(arc_path(cx, cy, R, 180, 180 - 180*p/100.0) for p in range(101))
+               for compact, (cx, cy, R, _) in GAUGE_GEOMETRY.items()}
+
+def gauge_arcs(pct, compact:bool=False):
+    # (base, fill) paths; integer pcts come from the precomputed table.
+    compact = bool(compact)
+    if pct == int(pct):
+        return _GAUGE_BASE[compact], _GAUGE_FILL[compact][int(pct)]
+    cx, cy, R, _ = GAUGE_GEOMETRY[compact]
+    return _GAUGE_BASE[compact], arc_path(cx, cy, R, 180, 180 - 180*pct/100.0)
+
+# ======================== CHARTS ========================
+def _render_gauge(pct, compact:bool)->str:
+    cx, cy, R, stroke = GAUGE_GEOMETRY[compact]
+    base, fill = gauge_arcs(pct, compact)
+    if compact:
+        # Smaller gauge for top display - matching image
+        return f"""
+        <svg width="220" height="150" viewBox="0 0 220 150">
+          <g fill="none" stroke-linecap="round">
+            <path d="{base}" stroke="#E9B98A" stroke-width="{stroke}" />
+            <path d="{fill}" stroke="#F97362" stroke-width="{stroke}" />
+          </g>
+          <circle cx="{cx}" cy="{cy}" r="{R-12}" fill="#0B1426"/>
+          <text x="{cx}" y="{cy-1}" text-anchor="middle" font-size="38" font-weight="1000" fill="#F8FAFC">{pct}%</text>
+        </svg>
+        """
+    return f"""
+        <svg width="340" height="240" viewBox="0 0 340 240">
+          <g fill="none" stroke-linecap="round">
+            <path d="{base}" stroke="#E9B98A" stroke-width="{stroke}" />
+            <path d="{fill}" stroke="#F97362" stroke-width="{stroke}" />
+          </g>
+          <circle cx="{cx}" cy="{cy}" r="{R-19}" fill="#0B1426"/>
+          <text x="{cx}" y="{cy-3}" text-anchor="middle" font-size="62" font-weight="1000" fill="#F8FAFC">{pct}%</text>
+        </svg>
+        """
+
+def semi_gauge_svg(pct:int=70, compact:bool=False)->str:
+    pct = max(0, min(100, pct))
+    compact = bool(compact)
+    return _cache.get_or_render(("gauge", pct, compact), lambda: _render_gauge(pct, compact))
+
+def _render_bar(counts)->str:
+    W, H = 320, 190
+    ymax = max(18, max(counts)+2)
+    labels = [("Downs", counts[0], "var(--bar1)"),
+              ("Turner", counts[1], "var(--bar2)"),
+              ("DiGeorge", counts[2], "var(--bar3)"),
+              ("Williams", counts[3], "var(--bar4)")]
+    barw, gap, x0, y0 = 48, 28, 38, H-32
+    svg = [f'<svg width="{W}" height="{H}" viewBox="0 0 {W} {H}">']
+    svg += [f'<line x1="{x0-14}" y1="24" x2="{x0-14}" y2="{y0}" stroke="#E5E7EB" stroke-width="2"/>',
+            f'<line x1="{x0-14}" y1="{y0}" x2="{W-18}" y2="{y0}" stroke="#E5E7EB" stroke-width="2"/>']
+    x = x0
+    for label, val, color in labels:
+        height = int((val / ymax) * (y0-28))
+        svg.append(f'<rect x="{x}" y="{y0-height}" width="{barw}" height="{height}" rx="8" fill="{color}"/>')
+        svg.append(f'<text x="{x+barw/2}" y="{y0+18}" text-anchor="middle" font-size="12" fill="#F8FAFC" font-weight="900">{label}</text>')
+        x += barw + gap
+    svg.append("</svg>")
+    return "".join(svg)
+
+def bar_svg(counts)->str:
+    counts = tuple(counts)
+    return _cache.get_or_render(("bar", counts), lambda: _render_bar(counts))
+
+def _render_donut(segments)->str:
+    cx, cy, R, stroke = 150, 140, 84, 36  # cx pushed right so donut isn't clipped
+    start = -90
+    svg = [f'<svg width="340" height="280" viewBox="0 0 340 280"><g fill="none" stroke-linecap="butt">']
+    for label, pct, color in segments:
+        sweep = 360*pct/100.0; end = start + sweep
+        path = arc_path(cx, cy, R, start, end)
+        svg.append(f'<path d="{path}" stroke="{color}" stroke-width="{stroke}"/>')
+        rx, ry = _point(cx, cy, R+38, (start+end)/2.0)
+        svg.append(f'<text x="{rx:.1f}" y="{ry:.1f}" text-anchor="middle" font-size="12" fill="#F8FAFC" font-weight="900">{label}</text>')
+        svg.append(f'<text x="{rx:.1f}" y="{ry+14:.1f}" text-anchor="middle" font-size="12" fill="#F8FAFC">{pct:.0f}%</text>')
+        start = end
+    svg.append('</g><circle cx="{cx}" cy="{cy}" r="{r}" fill="#0B1426"/></svg>'.format(cx=cx, cy=cy, r=R-24))
+    return "".join(svg)
+
+def donut_svg(segments)->str:
+    segments = tuple(tuple(s) for s in segments)
+    return _cache.get_or_render(("donut", segments), lambda: _render_donut(segments))
+
+# ======================== GAUGE WALL ========================
+# Unit-wide grid of compact gauges. The arcs and text styles are defined once
+# (wall_defs_svg) and every tile instances them with <use>: the fill arc has
+# pathLength=100, so a tile's stroke-dasharray="pct 100" draws pct% of it. Tiles come in memoized row
+# strips, so a refresh only renders rows whose patients or scores changed.
+WALL_TILE = (110, 82)  # tile width, height (the compact gauge at half scale plus a label)
+
+def wall_defs_svg()->str:
+    _, _, _, stroke = GAUGE_GEOMETRY[True]
+    arc = f'd="{_GAUGE_BASE[True]}" fill="none" stroke-width="{stroke}" stroke-linecap="round"'
+    return (f'<svg width="0" height="0" style="position:absolute"><defs>'
+            f'<style>.wall-pct{{font-size:38px;font-weight:1000;fill:#F8FAFC;text-anchor:middle}}'
+            f'.wall-id{{font-size:22px;fill:#C7D2FE;text-anchor:middle}}</style>'
+            f'<path id="wall-base" {arc} stroke="#E9B98A"/>'
+            f'<path id="wall-fill" {arc} stroke="#F97362" pathLength="100"/></defs></svg>')
+
+def _render_wall_row(tiles, cols:int)->str:
+    cx, cy, _, _ = GAUGE_GEOMETRY[True]
+    W, H = WALL_TILE
+    svg = [f'<svg width="{W*cols}" height="{H}" viewBox="0 0 {W*cols} {H}">']
+    for i, (label, pct) in enumerate(tiles):
+        fill = f'<use href="#wall-fill" stroke-dasharray="{pct} 100"/>' if pct > 0 else ""
+        svg.append(f'<g transform="translate({i*W},0) scale(.5)"><use href="#wall-base"/>{fill}'
+                   f'<text class="wall-pct" x="{cx}" y="{cy-1}">{pct}%</text>'
+                   f'<text class="wall-id" x="{cx}" y="{cy+52}">{label}</text></g>')
+    svg.append("</svg>")
+    return "".join(svg)
+
+def wall_row_svg(tiles, cols:int=10)->str:
+    # One row of the wall; tiles are (label, risk pct) pairs. Needs wall_defs_svg() on the page.
+    tiles = tuple((str(label), max(0, min(100, int(pct)))) for label, pct in tiles)
+    return _cache.get_or_render(("wall_row", tiles, cols), lambda: _render_wall_row(tiles, cols))
+
+# (label, unit, low, high, color) per lane, in vitals.VITALS column order
+VITAL_LANES = [("HR", "bpm", 60, 200, "var(--donut1)"),
+               ("SpO2", "%", 60, 100, "var(--donut2)"),
+               ("MAP", "mmHg", 20, 100, "var(--donut3)"),
+               ("RR", "/min", 0, 80, "var(--donut4)")]
+
+def vitals_svg(t, v, t_end:float, span_s:float)->str:
+    # Stacked lanes of downsampled vitals ending at t_end; t and v are (points, lanes).
+    # Not memoized: the stream moves on every refresh, and the input is already small.
+    W, lane_h, x0, x1 = 560, 50, 54, 486
+    H = lane_h*len(VITAL_LANES) + 26
+    t0 = t_end - span_s
+    svg = [f'<svg width="{W}" height="{H}" viewBox="0 0 {W} {H}">']
+    for i, (label, unit, lo, hi, color) in enumerate(VITAL_LANES):
+        top, bottom = 8 + i*lane_h, 8 + (i+1)*lane_h - 10
+        svg.append(f'<line x1="{x0}" y1="{bottom}" x2="{x1}" y2="{bottom}" stroke="#1E2A44" stroke-width="1"/>')
+        svg.append(f'<text x="{x0-8}" y="{(top+bottom)/2+4:.0f}" text-anchor="end" font-size="12" fill="#F8FAFC" font-weight="900">{label}</text>')
+        if len(t):
+            keep = t[:, i] >= t0
+            xs = x0 + (t[keep, i] - t0) * ((x1 - x0) / span_s)
+            ys = bottom - (v[keep, i].clip(lo, hi) - lo) * ((bottom - top) / (hi - lo))
+            pts = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs.tolist(), ys.tolist()))
+            svg.append(f'<polyline points="{pts}" fill="none" stroke="{color}" stroke-width="2" stroke-linejoin="round"/>')
+            svg.append(f'<text x="{x1+8}" y="{(top+bottom)/2+4:.0f}" font-size="12" fill="#F8FAFC" font-weight="900">{v[-1, i]:.0f} '
+                       f'<tspan fill="#C7D2FE" font-weight="400">{unit}</tspan></text>')
+    y = H - 6
+    for k in range(7):
+        x = x0 + k * (x1 - x0) / 6
+        hours = span_s / 3600 * (6 - k) / 6
+        svg.append(f'<text x="{x:.1f}" y="{y}" text-anchor="middle" font-size="11" fill="#C7D2FE">{"now" if k == 6 else f"-{hours:.0f}h"}</text>')
+    svg.append("</svg>")
+    return "".join(svg)
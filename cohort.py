@@ -0,0 +1,116 @@
+# cohort.py
+# Running cohort counters for the GENETIC ABNORMALITIES and SHUNT SIZE charts.
+# Counters are bucketed by (gender, prematurity, surgery date) so filtered views
+# sum a handful of buckets instead of rescanning patients, and add/edit/remove
+# touch exactly one bucket.
+import sys
+import threading
+from datetime import date
+
+import numpy as np
+
+from patients import GENDERS, GENETIC, SHUNT_SIZES
+
+N_GENETIC = len(GENETIC) - 1  # "No abnormality" isn't charted
+N_SHUNT = len(SHUNT_SIZES)
+
+def _entry(rec:dict):
+    # (bucket key, genetic code, shunt code) for a materialized patient record
+    bucket = (GENDERS.index(rec["gender"]), bool(rec["is_premature"]), rec["date_of_surg"].toordinal())
+    return bucket, GENETIC.index(rec["genetic"]), SHUNT_SIZES.index(rec["shunt_mm"])
+
+class CohortAggregates:
+    def __init__(self, store=None):
+        self.store = store
+        self._buckets = {}       # bucket key -> [genetic counts..., shunt counts...]
+        self._total = [0] * (N_GENETIC + N_SHUNT)
+        self._overrides = {}     # patient_id -> entry (or None if removed) differing from the store
+        self._lock = threading.Lock()
+        if store is not None and len(store):
+            self._load(store)
+
+    def _load(self, store):
+        # One vectorized pass over the mapped columns to seed every bucket.
+        c = store.column
+        days = (c("date_of_surg").astype("datetime64[D]").astype(np.int64)
+                + date(1970, 1, 1).toordinal())
+        keys = np.stack([c("gender").astype(np.int64), c("is_premature").astype(np.int64), days], axis=1)
+        uniq, inv = np.unique(keys, axis=0, return_inverse=True)
+        inv = inv.ravel()
+        counts = np.zeros((len(uniq), N_GENETIC + N_SHUNT), dtype=np.int64)
+        genetic = c("genetic").astype(np.intp)
+        has_gen = genetic > 0
+        np.add.at(counts, (inv[has_gen], genetic[has_gen] - 1), 1)
+        np.add.at(counts, (inv, N_GENETIC + c("shunt_mm").astype(np.intp)), 1)
+        for (g, p, d), row in zip(uniq.tolist(), counts.tolist()):
+            self._buckets[(g, bool(p), d)] = row
+        self._total = counts.sum(axis=0).tolist()
+
+    def _stored_entry(self, patient_id):
+        if patient_id in self._overrides:
+            return self._overrides[patient_id]
+        if self.store is None:
+            return None
+        row = self.store.row_of(patient_id)
+        return None if row is None else _entry(self.store.record(row))
+
+    def _apply(self, entry, sign:int):
+        bucket, genetic, shunt = entry
+        counts = self._buckets.setdefault(bucket, [0] * (N_GENETIC + N_SHUNT))
+        for i in ([genetic - 1] if genetic else []) + [N_GENETIC + shunt]:
+            counts[i] += sign
+            self._total[i] += sign
+
+    def upsert(self, rec:dict):
+        # Add a new patient or apply an edit; a no-op when nothing charted changed.
+        new = _entry(rec)
+        with self._lock:
+            old = self._stored_entry(rec["patient_id"])
+            if old == new:
+                return
+            if old is not None:
+                self._apply(old, -1)
+            self._apply(new, +1)
+            self._overrides[rec["patient_id"]] = new
+
+    def replace(self, old:dict, new:dict):
+        # Count `new` instead of `old` (either may be None) without tracking the patient;
+        # for corrections layered over another set of counters.
+        with self._lock:
+            if old is not None:
+                self._apply(_entry(old), -1)
+            if new is not None:
+                self._apply(_entry(new), +1)
+
+    def remove(self, patient_id:str):
+        with self._lock:
+            old = self._stored_entry(patient_id)
+            if old is not None:
+                self._apply(old, -1)
+                self._overrides[patient_id] = None
+
+    def counts(self, genders=None, premature=None, date_from:date=None, date_to:date=None):
+        # (genetic counts, shunt counts) for patients matching every given filter.
+        with self._lock:
+            if genders is None and premature is None and date_from is None and date_to is None:
+                total = list(self._total)
+            else:
+                codes = None if genders is None else {GENDERS.index(g) for g in genders}
+                lo = date_from.toordinal() if date_from else -1
+                hi = date_to.toordinal() if date_to else float("inf")
+                total = [0] * (N_GENETIC + N_SHUNT)
+                for (g, p, d), row in self._buckets.items():
+                    if (codes is None or g in codes) and (premature is None or p == premature) and lo <= d <= hi:
+                        total = [a + b for a, b in zip(total, row)]
+        return total[:N_GENETIC], total[N_GENETIC:]
+
+    def memory_usage(self)->int:
+        # rough heap estimate: one key tuple and one list of small ints per bucket
+        per_bucket = sys.getsizeof((0, False, 0)) + sys.getsizeof([0] * (N_GENETIC + N_SHUNT))
+        with self._lock:
+            return (sys.getsizeof(self._buckets) + len(self._buckets) * per_bucket
+                    + sys.getsizeof(self._overrides) + len(self._overrides) * sys.getsizeof((0, 0, 0)))
+
+def shunt_percentages(shunt_counts)->list:
+    total = max(1, sum(shunt_counts))
+    return [round(100*c/total, 1) for c in shunt_counts]
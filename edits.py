@@ -0,0 +1,362 @@
+# edits.py
+# Durable patient edits: an append-only log in SQLite (WAL mode) beside the
+# patient store, folded into a per-patient snapshot table every so often.
+#
+#   python edits.py stats data/patients
+#   python edits.py compact data/patients
+#   python edits.py bench /tmp/edits.sqlite --edits 1000000 --threads 8
+#
+# Sessions never wait on the disk. append() merges the change into the
+# in-memory state under a short lock and queues it. A single writer thread
+# drains the queue in batches: one transaction and one fsync per batch, however
+# many sessions contributed to it. After every `compact_every` logged edits,
+# the writer folds the log into the snapshot table and deletes the folded rows.
+# Startup therefore replays at most one snapshot row per edited patient plus a
+# bounded tail, no matter how many edits were ever made.
+#
+# Other processes (the API, exports) open the same log read-only: no writer
+# thread, nothing created or compacted, and refresh() to pick up what the
+# dashboard has committed since.
+#
+# If the database is busy or a write fails, the writer rolls back, keeps the
+# edits it holds and retries with backoff. stats() reports the error until a
+# write succeeds again.
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+from urllib.request import pathname2url
+
+from patients import SCHEMA
+
+EDITS_FILE = "edits.sqlite"
+DATE_FIELDS = {name for name, kind in SCHEMA.items() if kind.startswith("datetime64")}
+
+def encode(fields:dict)->str:
+    return json.dumps({k: v.isoformat() if k in DATE_FIELDS else v for k, v in fields.items()}, sort_keys=True)
+
+def decode(text:str)->dict:
+    return {k: date.fromisoformat(v) if k in DATE_FIELDS else v for k, v in json.loads(text).items()}
+
+class EditLog:
+    def __init__(self, path:str, compact_every:int=50000, batch:int=1024, linger_s:float=0.005, busy_s:float=5.0,
+                 readonly:bool=False):
+        self.path = path
+        self.readonly = readonly      # read an existing log that another process writes
+        self.compact_every = compact_every
+        self.batch = batch
+        self.linger_s = linger_s      # how long the writer waits for more edits to share a commit
+        self.busy_s = busy_s          # how long a write waits on another connection's lock before failing
+        self._state = {}              # patient_id -> {field: value}, everything appended so far
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._reader = None           # refresh()'s connection, opened on first use
+        self._read_lock = threading.Lock()
+        self._data_version = None
+        self.generation = 0           # bumped whenever the state changes
+        self._error = None            # last write error, cleared by the next successful write
+        self._stats = dict(appended=0, written=0, commits=0, compactions=0, errors=0, replayed=0, replay_ms=0.0)
+        t0 = time.perf_counter()
+        db = self._connect()
+        if readonly:
+            self._reader, self._writer = db, None
+            db.execute("BEGIN")  # snapshot and tail from one consistent read
+            try:
+                self._replay(db)
+            finally:
+                db.execute("COMMIT")
+        else:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS edits(seq INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL,
+                                                 patient_id TEXT NOT NULL, fields TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS snapshot(patient_id TEXT PRIMARY KEY, fields TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """)
+            self._replay(db)
+        self._stats["replay_ms"] = (time.perf_counter() - t0) * 1000.0
+        if not readonly:
+            self._writer = threading.Thread(target=self._run, args=(db,), name=f"edit-log:{path}", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _connect(self):
+        if self.readonly:
+            uri = "file:" + pathname2url(os.path.abspath(self.path)) + "?mode=ro"
+            return sqlite3.connect(uri, uri=True, timeout=self.busy_s, check_same_thread=False, isolation_level=None)
+        db = sqlite3.connect(self.path, timeout=self.busy_s, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")  # a commit is on disk once it returns
+        return db
+
+    def _replay(self, db):
+        # snapshot rows, then the log tail past the snapshot, in order
+        for pid, fields in db.execute("SELECT patient_id, fields FROM snapshot"):
+            self._state[pid] = decode(fields)
+        self._read_seq = self._snapshot_seq(db)
+        n = 0
+        for seq, pid, fields in db.execute("SELECT seq, patient_id, fields FROM edits WHERE seq > ? ORDER BY seq",
+                                           (self._read_seq,)):
+            self._state.setdefault(pid, {}).update(decode(fields))
+            self._read_seq = seq
+            n += 1
+        self._tail = n
+        self._stats["replayed"] = len(self._state) + n
+
+    @staticmethod
+    def _snapshot_seq(db)->int:
+        row = db.execute("SELECT value FROM meta WHERE key = 'snapshot_seq'").fetchone()
+        return row[0] if row else 0
+
+    # ---- sessions ----
+    def append(self, patient_id:str, fields:dict):
+        # Record changed fields for a patient. Visible to get() at once and on disk within a commit or two.
+        if not fields:
+            return
+        if self._closed or self.readonly:
+            raise ValueError(f"edit log {self.path} is {'read-only' if self.readonly else 'closed'}")
+        patient_id = str(patient_id)
+        with self._lock:
+            self._state.setdefault(patient_id, {}).update(fields)
+            self._stats["appended"] += 1
+            self.generation += 1
+            self._queue.put((time.time(), patient_id, dict(fields)))  # under the lock: log order == state order
+
+    def get(self, patient_id:str)->dict:
+        with self._lock:
+            return dict(self._state.get(str(patient_id), ()))
+
+    def items(self)->list:
+        with self._lock:
+            return [(pid, dict(f)) for pid, f in self._state.items()]
+
+    def __len__(self):
+        return len(self._state)
+
+    def refresh(self)->set:
+        # Pick up edits that other processes committed since the last replay or refresh, and
+        # return the patient ids they touched. For processes that read a log others write.
+        with self._read_lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            db = self._reader
+            data_version = db.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return set()
+            self._data_version = data_version
+            db.execute("BEGIN")
+            try:
+                since, state = self._snapshot_seq(db), None
+                if since > self._read_seq:
+                    # compacted past what we read: start over from the snapshot
+                    state = {pid: decode(f) for pid, f in db.execute("SELECT patient_id, fields FROM snapshot")}
+                rows = db.execute("SELECT seq, patient_id, fields FROM edits WHERE seq > ? ORDER BY seq",
+                                  (max(since, self._read_seq) if state is None else since,)).fetchall()
+            finally:
+                db.execute("COMMIT")
+            changed = set()
+            with self._lock:
+                if state is not None:
+                    changed = {pid for pid in state.keys() | self._state.keys() if state.get(pid) != self._state.get(pid)}
+                    self._state = state
+                for seq, pid, fields in rows:
+                    self._state.setdefault(pid, {}).update(decode(fields))
+                    changed.add(pid)
+                if changed:
+                    self.generation += 1
+            if rows:
+                self._read_seq = rows[-1][0]
+            elif state is not None:
+                self._read_seq = since
+            return changed
+
+    def stats(self)->dict:
+        with self._lock:
+            s = dict(self._stats, patients=len(self._state), pending=self._stats["appended"] - self._stats["written"],
+                     tail=self._tail, error=self._error)
+        s["edits_per_commit"] = s["written"] / s["commits"] if s["commits"] else 0.0
+        return s
+
+    def flush(self, timeout:float=10.0)->bool:
+        # Wait until everything appended so far has been committed; False on timeout.
+        if self._writer is None:
+            return True  # read-only: nothing is ever appended
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def compact(self, timeout:float=60.0)->bool:
+        # Fold the log into the snapshot now; False if that didn't finish within `timeout`.
+        if self._writer is None:
+            raise ValueError(f"edit log {self.path} is read-only")
+        done = threading.Event()
+        self._queue.put(("compact", done))
+        return done.wait(timeout)
+
+    def close(self, timeout:float=10.0):
+        # Stop the writer once it has committed what it holds (or given up on it).
+        self._closed = True
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout)
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    # ---- writer thread ----
+    def _take(self, wait:bool)->list:
+        # Up to `batch` queued items, lingering briefly so concurrent edits share a commit.
+        try:
+            items = [self._queue.get(block=wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger_s
+        while len(items) < self.batch:
+            try:
+                items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self, db):
+        rows, waiters, compactions = [], [], []  # held until a write succeeds
+        stopping, failures = False, 0
+        while True:
+            for it in self._take(wait=not (rows or compactions or stopping)):
+                if it is None:
+                    stopping = True
+                elif isinstance(it, threading.Event):
+                    waiters.append(it)
+                elif len(it) == 2:
+                    compactions.append(it[1])
+                else:
+                    rows.append(it)
+            try:
+                if rows:
+                    self._commit(db, rows)
+                    rows = []
+                for done in waiters:
+                    done.set()
+                waiters = []
+                if compactions or self._tail >= self.compact_every:
+                    self._compact(db)
+                    for done in compactions:
+                        done.set()
+                    compactions = []
+                failures = 0
+            except sqlite3.Error as e:
+                if db.in_transaction:
+                    db.rollback()
+                failures += 1
+                with self._lock:
+                    self._stats["errors"] += 1
+                    self._error = f"{type(e).__name__}: {e}"
+                if not (stopping and failures >= 3):
+                    time.sleep(min(5.0, 0.05 * 2 ** failures))
+                    continue
+            if stopping:
+                db.close()
+                return
+
+    def _commit(self, db, rows):
+        db.execute("BEGIN")
+        db.executemany("INSERT INTO edits(ts, patient_id, fields) VALUES (?, ?, ?)",
+                       [(ts, pid, encode(fields)) for ts, pid, fields in rows])
+        db.execute("COMMIT")
+        self._tail += len(rows)
+        with self._lock:
+            self._stats["written"] += len(rows)
+            self._stats["commits"] += 1
+            self._error = None
+
+    def _compact(self, db):
+        # Fold every logged edit into the snapshot table and drop the folded rows.
+        db.execute("BEGIN IMMEDIATE")
+        since = self._snapshot_seq(db)
+        last = db.execute("SELECT COALESCE(MAX(seq), ?) FROM edits", (since,)).fetchone()[0]
+        merged = {}
+        for pid, fields in db.execute("SELECT patient_id, fields FROM edits WHERE seq > ? AND seq <= ? ORDER BY seq",
+                                      (since, last)):
+            merged.setdefault(pid, {}).update(json.loads(fields))
+        for pid, fields in merged.items():
+            row = db.execute("SELECT fields FROM snapshot WHERE patient_id = ?", (pid,)).fetchone()
+            if row:
+                fields = {**json.loads(row[0]), **fields}
+            db.execute("INSERT OR REPLACE INTO snapshot(patient_id, fields) VALUES (?, ?)",
+                       (pid, json.dumps(fields, sort_keys=True)))
+        db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('snapshot_seq', ?)", (last,))
+        db.execute("DELETE FROM edits WHERE seq <= ?", (last,))
+        db.execute("COMMIT")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._tail = 0
+        with self._lock:
+            self._stats["compactions"] += 1
+            self._error = None
+
+def open_edit_log(store_path:str, readonly:bool=False):
+    # The store's edit log, or None when the store directory can't hold one (read-only
+    # store) or, for a read-only open, when nobody has written one yet.
+    path = os.path.join(store_path, EDITS_FILE)
+    if readonly and not os.path.exists(path):
+        return None
+    try:
+        return EditLog(path, readonly=readonly)
+    except (sqlite3.Error, OSError):
+        return None
+
+# ======================== CLI ========================
+def _bench(path, n, threads, compact_every):
+    log = EditLog(path, compact_every=compact_every)
+
+    def worker(k):
+        for i in range(k, n, threads):
+            log.append(str(100000000 + i % 20000), dict(weight_kg=round(3 + (i % 50) / 10, 1), cpb_time=i % 240))
+
+    t0 = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    appended = time.perf_counter() - t0
+    log.flush(timeout=600)
+    durable = time.perf_counter() - t0
+    stats = log.stats()
+    log.close()
+    print(f"{n:,} edits from {threads} threads: appended in {appended:.2f}s, durable in {durable:.2f}s "
+          f"({n / durable:,.0f}/s, {stats['edits_per_commit']:.0f} edits per commit, {stats['compactions']} compactions)")
+    reopened = EditLog(path, compact_every=compact_every)
+    s = reopened.stats()
+    reopened.close()
+    print(f"reopen: {s['patients']:,} patients from {s['replayed']:,} rows in {s['replay_ms']:.0f} ms")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Patient edit log tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("stats", "compact"):
+        sub.add_parser(name).add_argument("store", help="patient store directory")
+    b = sub.add_parser("bench", help="append edits from several threads, then time a reopen")
+    b.add_argument("path", help="scratch database file")
+    b.add_argument("--edits", type=int, default=1000000)
+    b.add_argument("--threads", type=int, default=8)
+    b.add_argument("--compact-every", type=int, default=50000)
+    args = ap.parse_args(argv)
+    if args.cmd == "bench":
+        _bench(args.path, args.edits, args.threads, args.compact_every)
+        return 0
+    log = EditLog(os.path.join(args.store, EDITS_FILE))
+    if args.cmd == "compact":
+        log.compact()
+    print(json.dumps(log.stats(), indent=2))
+    log.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+# events.py
+# Post-op complication events for the POST OPERATIVE COMPLICATIONS flow: an
+# append-only log with per-patient, per-stage and per-transition indexes.
+#
+#   python events.py demo data/patients      # write demo events next to a store
+#
+# Events live beside the patient store in events/, one .npy per column like
+# patients.py. Indexing sorts the log by (patient, time), so each patient's
+# events form one slice and consecutive rows of the same patient are their
+# stage-to-stage transitions. Stage events and transitions are then grouped by
+# stage / (from, to) pair and sorted by time. A query such as "Sepsis -> Stroke
+# in the last 30 days" is one slice plus a binary search; no scan over events.
+#
+# Events added while the app runs go to a short tail that queries also check.
+# The tail is folded into the indexes once it grows, and the counts are kept
+# current on every add. Each added event is first appended (and fsynced) to
+# events/tail.csv; opening the log replays that file, and every `compact_at`
+# events it is folded into the column files and emptied. Readers in other
+# processes (exports) open it read-only and never change those files.
+import os
+import sys
+import threading
+from datetime import date
+
+import numpy as np
+
+STAGES = ["Cardiac Arrest", "Reoperation Bleed", "Sepsis", "Chylothorax Intervention", "Stroke", "Sudden Hypoxemia"]
+N_STAGES = len(STAGES)
+EVENT_SCHEMA = dict(patient_id="U16", stage="u1", ts="datetime64[s]")
+EVENTS_DIR = "events"
+TAIL_FILE = "tail.csv"
+
+def _stage(stage)->int:
+    return stage if isinstance(stage, (int, np.integer)) else STAGES.index(stage)
+
+class EventStore:
+    def __init__(self, patient_id, stage, ts, path:str=None, compact_at:int=1024, readonly:bool=False):
+        self.path = path
+        self.compact_at = compact_at
+        self.readonly = readonly  # reads the files at `path` that another process writes
+        self._lock = threading.Lock()
+        self._logged = 0  # events in the on-disk tail
+        self._index(np.asarray(patient_id).astype("U16"), np.asarray(stage, np.uint8),
+                    np.asarray(ts).astype("datetime64[s]"))
+        if path is not None:
+            self._replay()
+
+    def _index(self, pid, stage, ts):
+        order = np.lexsort((ts, pid))
+        self.pid, self.stage, self.ts = pid[order], stage[order], ts[order]
+        # per patient: sorted unique ids and the slice each one owns
+        self.patients, starts = np.unique(self.pid, return_index=True)
+        self._patient_bounds = np.r_[starts, len(self.pid)]
+        # per stage: rows ordered by (stage, time)
+        self._stage_rows = np.lexsort((self.ts, self.stage))
+        self._stage_bounds = np.searchsorted(self.stage[self._stage_rows], np.arange(N_STAGES + 1))
+        # transitions: consecutive events of one patient, ordered by ((from, to), time of `to`)
+        src = np.flatnonzero(self.pid[1:] == self.pid[:-1])
+        pair = self.stage[src].astype(np.int64) * N_STAGES + self.stage[src + 1]
+        order = np.lexsort((self.ts[src + 1], pair))
+        self._pair_rows = src[order] + 1
+        self._pair_bounds = np.searchsorted(pair[order], np.arange(N_STAGES * N_STAGES + 1))
+        self._stage_counts = np.bincount(self.stage, minlength=N_STAGES)
+        self._transitions = np.bincount(pair, minlength=N_STAGES * N_STAGES).reshape(N_STAGES, N_STAGES)
+        self._latest = self.ts.max() if len(self.ts) else None
+        self._tail = []    # (patient_id, stage, ts) added since indexing
+        self._tail_tr = [] # (from, to, ts, patient_id) among them
+        self._last = {}    # patient_id -> (stage, ts) of their latest tail event
+
+    def __len__(self):
+        return len(self.pid) + len(self._tail)
+
+    # ---- updates ----
+    def add(self, patient_id:str, stage, ts):
+        # Record one complication; counts and transition counts update in place. With a path
+        # it's on disk before it counts (OSError if it can't be written).
+        if self.readonly:
+            raise ValueError(f"event log {self.path} is read-only")
+        patient_id, stage, ts = str(patient_id), _stage(stage), np.datetime64(ts, "s")
+        with self._lock:
+            if self.path is not None:
+                with open(os.path.join(self.path, TAIL_FILE), "a") as f:
+                    f.write(f"{patient_id},{stage},{ts}\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._logged += 1
+            self._add(patient_id, stage, ts)
+            if self.path is not None and self._logged >= self.compact_at:
+                self._save(self.path)
+
+    def _replay(self):
+        # Re-add the on-disk tail, skipping events a save already folded in before it
+        # could empty the file.
+        tail = os.path.join(self.path, TAIL_FILE)
+        if not os.path.exists(tail):
+            return
+        with open(tail) as f:
+            lines = f.readlines()
+        if lines and not lines[-1].endswith("\n"):
+            # Torn last line from a crash mid-append (or, for a reader, an append still in
+            # progress). The writer cuts it off so its next append starts a fresh line.
+            lines.pop()
+            if not self.readonly:
+                with open(tail, "r+") as f:
+                    f.truncate(sum(len(line.encode()) for line in lines))
+        for line in lines:
+            try:
+                patient_id, stage, ts = line.rstrip("\n").split(",")
+                stage, ts = int(stage), np.datetime64(ts, "s")
+            except ValueError:
+                continue
+            self._logged += 1
+            s, e = self._patient_slice(patient_id)
+            if ((self.stage[s:e] == stage) & (self.ts[s:e] == ts)).any():
+                continue
+            self._add(patient_id, stage, ts)
+
+    def _add(self, patient_id, stage, ts):
+        prev = self._last.get(patient_id) or self._indexed_last(patient_id)
+        self._tail.append((patient_id, stage, ts))
+        self._last[patient_id] = (stage, ts)
+        self._latest = ts if self._latest is None else max(self._latest, ts)
+        self._stage_counts[stage] += 1
+        if prev is not None:
+            self._transitions[prev[0], stage] += 1
+            self._tail_tr.append((prev[0], stage, ts, patient_id))
+        if (prev is not None and ts < prev[1]) or len(self._tail) >= self.compact_at:
+            self._compact()  # out-of-order events need the (patient, time) sort redone
+
+    def _indexed_last(self, patient_id):
+        s, e = self._patient_slice(patient_id)
+        return (int(self.stage[e - 1]), self.ts[e - 1]) if e > s else None
+
+    def _compact(self):
+        if self._tail:
+            pid, stage, ts = zip(*self._tail)
+            self._index(np.concatenate([self.pid, np.array(pid, "U16")]),
+                        np.concatenate([self.stage, np.array(stage, np.uint8)]),
+                        np.concatenate([self.ts, np.array(ts, "datetime64[s]")]))
+
+    # ---- queries ----
+    def _patient_slice(self, patient_id):
+        i = np.searchsorted(self.patients, patient_id)
+        if i < len(self.patients) and self.patients[i] == patient_id:
+            return self._patient_bounds[i], self._patient_bounds[i + 1]
+        return 0, 0
+
+    def stage_counts(self)->np.ndarray:
+        return self._stage_counts.copy()
+
+    def transition_counts(self)->np.ndarray:
+        # [from, to] counts of one complication directly following another in the same patient
+        return self._transitions.copy()
+
+    def transition_probabilities(self)->np.ndarray:
+        counts = self.transition_counts()
+        return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    def patient_events(self, patient_id:str)->list:
+        # [(stage name, timestamp)] for one patient, oldest first
+        patient_id = str(patient_id)
+        with self._lock:
+            s, e = self._patient_slice(patient_id)
+            out = [(STAGES[st], t) for st, t in zip(self.stage[s:e].tolist(), self.ts[s:e])]
+            out += [(STAGES[st], t) for pid, st, t in self._tail if pid == patient_id]
+        return out
+
+    def patient_stages(self, patient_id:str)->set:
+        return {name for name, _ in self.patient_events(patient_id)}
+
+    def stage_patients(self, stage, since=None, until=None)->np.ndarray:
+        # patient ids with an event at `stage` in [since, until]
+        stage = _stage(stage)
+        with self._lock:
+            rows = self._stage_rows[self._stage_bounds[stage]:self._stage_bounds[stage + 1]]
+            rows = rows[self._time_range(self.ts[rows], since, until)]
+            tail = [pid for pid, st, t in self._tail if st == stage and _within(t, since, until)]
+        return np.unique(np.concatenate([self.pid[rows], np.array(tail, "U16")]))
+
+    def transition_patients(self, src, dst, since=None, until=None)->np.ndarray:
+        # patient ids who went straight from `src` to `dst`, with the `dst` event in [since, until]
+        src, dst = _stage(src), _stage(dst)
+        pair = src * N_STAGES + dst
+        with self._lock:
+            rows = self._pair_rows[self._pair_bounds[pair]:self._pair_bounds[pair + 1]]
+            rows = rows[self._time_range(self.ts[rows], since, until)]
+            tail = [pid for a, b, t, pid in self._tail_tr if (a, b) == (src, dst) and _within(t, since, until)]
+        return np.unique(np.concatenate([self.pid[rows], np.array(tail, "U16")]))
+
+    @staticmethod
+    def _time_range(sorted_ts, since, until)->slice:
+        lo = 0 if since is None else np.searchsorted(sorted_ts, np.datetime64(since, "s"), side="left")
+        hi = len(sorted_ts) if until is None else np.searchsorted(sorted_ts, np.datetime64(until, "s"), side="right")
+        return slice(lo, hi)
+
+    def latest(self):
+        # timestamp of the newest event, or None for an empty log
+        return self._latest
+
+    # ---- persistence ----
+    def save(self, path:str=None):
+        if self.readonly and path in (None, self.path):
+            raise ValueError(f"event log {self.path} is read-only")
+        with self._lock:
+            self._save(path or self.path)
+
+    def _save(self, path:str):
+        self._compact()
+        write_events(path, dict(patient_id=self.pid, stage=self.stage, ts=self.ts))
+        if path == self.path:
+            with open(os.path.join(path, TAIL_FILE), "w") as f:
+                os.fsync(f.fileno())
+            self._logged = 0
+
+def _within(t, since, until)->bool:
+    return (since is None or t >= np.datetime64(since, "s")) and (until is None or t <= np.datetime64(until, "s"))
+
+def write_events(path:str, columns:dict):
+    os.makedirs(path, exist_ok=True)
+    for name, kind in EVENT_SCHEMA.items():
+        tmp = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp, np.asarray(columns[name]).astype(kind))
+        os.replace(tmp, os.path.join(path, f"{name}.npy"))
+
+def open_events(store_path:str, readonly:bool=False):
+    # The event log beside a patient store, or None when it has none.
+    path = os.path.join(store_path, EVENTS_DIR)
+    if not os.path.isdir(path):
+        return None
+    cols = {name: np.load(os.path.join(path, f"{name}.npy")) for name in EVENT_SCHEMA}
+    return EventStore(cols["patient_id"], cols["stage"], cols["ts"], path, readonly=readonly)
+
+# ======================== DEMO DATA ========================
+# Rough stage-to-stage odds for the demo log: mostly onward, sometimes back.
+DEMO_NEXT = np.array([[0.05, 0.35, 0.20, 0.10, 0.15, 0.15],
+                      [0.10, 0.05, 0.40, 0.20, 0.10, 0.15],
+                      [0.10, 0.05, 0.05, 0.25, 0.30, 0.25],
+                      [0.05, 0.10, 0.20, 0.05, 0.25, 0.35],
+                      [0.20, 0.05, 0.15, 0.10, 0.05, 0.45],
+                      [0.40, 0.10, 0.20, 0.10, 0.15, 0.05]])
+
+def demo_events(patient_ids, surgery_dates, rate:float=0.35, seed:int=0, until=None)->dict:
+    # Complication chains of 1-4 events in the weeks after surgery for a share of patients,
+    # moved forward so the newest lands at `until` (default: now) when the store is older.
+    rng = np.random.default_rng(seed)
+    rows = np.flatnonzero(rng.random(len(patient_ids)) < rate)
+    pid, stage, ts = [], [], []
+    for r in rows:
+        t = np.datetime64(surgery_dates[r], "s") + int(rng.integers(3600, 3 * 86400))
+        s = int(rng.integers(0, N_STAGES))
+        for _ in range(int(rng.integers(1, 5))):
+            pid.append(patient_ids[r]); stage.append(s); ts.append(t)
+            s = int(rng.choice(N_STAGES, p=DEMO_NEXT[s]))
+            t = t + int(rng.integers(3600, 10 * 86400))
+    ts = np.array(ts, "datetime64[s]")
+    if len(ts):
+        ts += max(np.timedelta64(0, "s"), np.datetime64("now" if until is None else until, "s") - ts.max())
+    return dict(patient_id=np.array(pid, "U16"), stage=np.array(stage, np.uint8), ts=ts)
+
+if __name__ == "__main__":
+    # python events.py demo <store_dir>
+    if len(sys.argv) != 3 or sys.argv[1] != "demo":
+        sys.exit("usage: python events.py demo <store_dir>")
+    from patients import PatientStore
+    store = PatientStore(sys.argv[2])
+    cols = demo_events(store.column("patient_id"), store.column("date_of_surg"))
+    path = os.path.join(sys.argv[2], EVENTS_DIR)
+    write_events(path, cols)
+    if os.path.exists(os.path.join(path, TAIL_FILE)):
+        os.remove(os.path.join(path, TAIL_FILE))  # events recorded against the old log
+    print(f"wrote {len(cols['stage']):,} events for {len(np.unique(cols['patient_id'])):,} patients "
+          f"up to {cols['ts'].max().astype(date) if len(cols['ts']) else '-'}")
@@ -0,0 +1,179 @@
+# export.py
+# Offline batch export of the Patient Overview for every patient in a store.
+#
+#   python export.py data/patients out/                 # HTML, one worker per core
+#   python export.py data/patients out/ --pdf           # also PDF (needs weasyprint)
+#   python export.py data/patients out/ --ids 100000001,100000002
+#
+# Each worker maps the store itself and writes its pages straight to disk, so
+# memory stays flat no matter how many patients are exported. Finished
+# patients are appended to out/_manifest.jsonl, and a rerun skips them, so an
+# interrupted export resumes where it stopped.
+#
+# Pages show each patient as the dashboard does: the store row with the edits
+# committed to the store's edit log (edits.py) applied on top.
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from cohort import CohortAggregates, shunt_percentages
+from edits import open_edit_log
+from events import open_events
+from neighbours import open_index, shunt_summary
+from patients import PatientStore
+from risk import DEFAULT_COEFFICIENTS, score_record
+from views import patient_page_html
+
+MANIFEST = "_manifest.jsonl"
+
+# ======================== WORKER ========================
+_worker = {}
+
+def _init_worker(store_path, out_dir, counts, shunt_pcts, edits, pdf):
+    store = PatientStore(store_path)
+    neighbours = open_index(store)
+    for rec in _edited(store, edits):
+        neighbours.upsert(rec)
+    _worker.update(store=store, neighbours=neighbours, events=open_events(store_path, readonly=True), out_dir=out_dir,
+                   counts=counts, shunt_pcts=shunt_pcts, edits=edits, pdf=pdf)
+    if pdf:
+        from weasyprint import HTML
+        _worker["HTML"] = HTML
+
+def _edited(store, edits:dict):
+    # records of stored patients with committed edits, edits applied
+    for pid, fields in edits.items():
+        rec = store.get(pid)
+        if rec is not None:
+            yield {**rec, **fields}
+
+def _write_atomic(path, data:bytes):
+    # Never leave a half-written page behind for the resume check to trust.
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def render_patient(rec:dict, counts, shunt_pcts, neighbours=None, events=None, k:int=50)->str:
+    risk_pct = score_record(rec)
+    summary = None
+    if neighbours is not None:
+        _, shunts, weights, _ = neighbours.query(rec, k)
+        summary = shunt_summary(rec, shunts, weights)
+    flow = None
+    if events is not None:
+        flow = dict(stage_counts=events.stage_counts(), probabilities=events.transition_probabilities(),
+                    patient_stages=events.patient_stages(rec["patient_id"]))
+    return patient_page_html(rec, risk_pct, counts, shunt_pcts, DEFAULT_COEFFICIENTS["premature"], summary, flow)
+
+def _export_rows(rows):
+    done = []
+    for row in rows:
+        rec = _worker["store"].record(row)
+        rec.update(_worker["edits"].get(rec["patient_id"], {}))
+        html = render_patient(rec, _worker["counts"], _worker["shunt_pcts"], _worker["neighbours"],
+                              _worker["events"])
+        base = os.path.join(_worker["out_dir"], rec["patient_id"])
+        _write_atomic(base + ".html", html.encode("utf-8"))
+        if _worker["pdf"]:
+            _write_atomic(base + ".pdf", _worker["HTML"](string=html).write_pdf())
+        done.append(rec["patient_id"])
+    return done
+
+# ======================== DRIVER ========================
+def _read_manifest(path)->set:
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["patient_id"])
+                except (ValueError, KeyError):
+                    pass  # torn last line from an interrupted run
+    return done
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def export(store_path, out_dir, workers=None, pdf=False, ids=None, chunk=32, progress=True)->int:
+    store = PatientStore(store_path)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    done = _read_manifest(manifest_path)
+
+    if ids is None:
+        all_ids = store.column("patient_id")
+        rows = (r for r in range(len(store)) if str(all_ids[r]) not in done)
+        todo = len(store) - len(done)
+    else:
+        missing = [i for i in ids if i not in store]
+        if missing:
+            raise KeyError(f"not in store: {', '.join(missing)}")
+        rows = (store.row_of(i) for i in ids if i not in done)
+        todo = len([i for i in ids if i not in done])
+
+    # Committed edits are read once here and handed to every worker.
+    log = open_edit_log(store_path, readonly=True)
+    edits = dict(log.items()) if log is not None else {}
+    if log is not None:
+        log.close()
+
+    # Cohort charts are the same on every page; count them once here. Building the
+    # neighbour index here too means the workers just load the saved copy.
+    aggregates = CohortAggregates(store)
+    for rec in _edited(store, edits):
+        aggregates.upsert(rec)
+    counts, shunt_counts = aggregates.counts()
+    open_index(store)
+    initargs = (store_path, out_dir, counts, shunt_percentages(shunt_counts), edits, pdf)
+
+    t0, n, shown = time.perf_counter(), 0, 0.0
+    with Pool(workers, initializer=_init_worker, initargs=initargs) as pool, \
+            open(manifest_path, "a") as manifest:
+        for batch in pool.imap_unordered(_export_rows, _chunks(rows, chunk)):
+            ts = time.time()
+            manifest.writelines(json.dumps(dict(patient_id=pid, ts=ts)) + "\n" for pid in batch)
+            manifest.flush()
+            n += len(batch)
+            if progress and (time.perf_counter() - shown > 0.5 or n == todo):
+                shown = time.perf_counter()
+                print(f"\r{n}/{todo} patients ({n / (time.perf_counter() - t0):.0f}/s)", end="", file=sys.stderr)
+    if progress:
+        print(file=sys.stderr)
+    return n
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export Patient Overview pages to static HTML/PDF")
+    ap.add_argument("store", help="patient store directory (see patients.py)")
+    ap.add_argument("out", help="output directory")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    ap.add_argument("--pdf", action="store_true", help="also write PDFs (requires weasyprint)")
+    ap.add_argument("--ids", help="comma-separated patient ids (default: every patient)")
+    ap.add_argument("--chunk", type=int, default=32, help="patients per worker task")
+    args = ap.parse_args(argv)
+
+    if args.pdf:
+        try:
+            import weasyprint  # noqa: F401
+        except ImportError:
+            ap.error("--pdf needs weasyprint (pip install weasyprint)")
+    ids = [i.strip() for i in args.ids.split(",") if i.strip()] if args.ids else None
+    try:
+        n = export(args.store, args.out, args.workers, args.pdf, ids, args.chunk)
+    except KeyError as e:
+        ap.error(e.args[0])
+    print(f"exported {n} patients to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
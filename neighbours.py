@@ -0,0 +1,264 @@
+# neighbours.py
+# Comparable-patient index for the SHUNT:WEIGHT pill: a KD-tree over weight at
+# surgery, age at surgery, gestational age, prematurity and BMI category.
+#
+#   python neighbours.py data/patients          # build and persist the index
+#   python neighbours.py data/patients --bench  # time k-NN queries against it
+#
+# The tree is built once and saved next to the store (neighbours.npz). Later
+# inserts and edits go into a small unindexed buffer that queries scan
+# brute-force; once the buffer grows past a fraction of the tree, everything
+# is rebuilt in memory. Edited patients leave a tombstone on their old tree
+# entry. The saved copy only ever holds the store as written; whoever opens
+# the index applies committed edits (edits.py) on top.
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from patients import BMI_CATS, SHUNT_SIZES, PatientStore, store_version
+
+INDEX_FILE = "neighbours.npz"
+LEAF_SIZE = 32
+TREE_ARRAYS = ("perm", "points", "dim", "val", "left", "right", "start", "stop")
+
+# One unit in each scaled feature is roughly one "clinically similar" step, so
+# plain Euclidean distance weighs them evenly.
+FEATURES = ["weight_kg", "age_at_surgery", "gest_age", "is_premature", "bmi_cat"]
+SCALES = np.array([0.5, 30.0, 14.0, 0.5, 1.0], dtype=np.float32)  # kg, days, days, flag, category
+
+def features(rec:dict)->np.ndarray:
+    # Scaled feature vector for one materialized patient record
+    return np.array([rec["weight_kg"],
+                     30 * int(rec["age_months"]) + int(rec["age_days"]),
+                     7 * int(rec["gest_weeks"]) + int(rec["gest_days"]),
+                     bool(rec["is_premature"]),
+                     BMI_CATS.index(rec["bmi_cat"])], dtype=np.float32) / SCALES
+
+def store_features(store:PatientStore)->np.ndarray:
+    c = store.column
+    return np.stack([c("weight_kg"),
+                     30 * c("age_months").astype(np.float32) + c("age_days"),
+                     7 * c("gest_weeks").astype(np.float32) + c("gest_days"),
+                     c("is_premature"),
+                     c("bmi_cat")], axis=1).astype(np.float32) / SCALES
+
+# ======================== KD-TREE ========================
+def build_tree(X:np.ndarray, leaf_size:int=LEAF_SIZE)->dict:
+    # Array-backed KD-tree. Node i splits on dim[i] at val[i] into left[i]/right[i];
+    # leaves (left == -1) own perm[start[i]:stop[i]].
+    perm = np.arange(len(X))
+    dim, val, left, right, start, stop = [], [], [], [], [], []
+
+    def node(s, e):
+        i = len(dim)
+        dim.append(-1); val.append(0.0); left.append(-1); right.append(-1); start.append(s); stop.append(e)
+        return i
+
+    stack = [node(0, len(X))]
+    while stack:
+        i = stack.pop()
+        s, e = start[i], stop[i]
+        if e - s <= leaf_size:
+            continue
+        pts = X[perm[s:e]]
+        d = int(np.argmax(pts.max(axis=0) - pts.min(axis=0)))
+        m = (e - s) // 2
+        order = np.argpartition(pts[:, d], m)
+        perm[s:e] = perm[s:e][order]
+        dim[i], val[i] = d, float(X[perm[s + m], d])
+        left[i], right[i] = node(s, s + m), node(s + m, e)
+        stack += [left[i], right[i]]
+    return dict(perm=perm, points=X[perm], dim=np.array(dim, np.int8), val=np.array(val, np.float32),
+                left=np.array(left, np.int32), right=np.array(right, np.int32),
+                start=np.array(start, np.int32), stop=np.array(stop, np.int32))
+
+def _merge(best_d, best_i, d, idx, k):
+    d, idx = np.concatenate([best_d, d]), np.concatenate([best_i, idx])
+    if len(d) > k:
+        keep = np.argpartition(d, k - 1)[:k]
+        d, idx = d[keep], idx[keep]
+    return d, idx
+
+def query_tree(tree:dict, q:np.ndarray, k:int, skip:np.ndarray=None):
+    # (squared distances, positions into tree["points"]) of the k nearest, unsorted;
+    # `skip` is a bool mask over positions to leave out.
+    dim, val, left, right = tree["dim"], tree["val"], tree["left"], tree["right"]
+    start, stop, points = tree["start"], tree["stop"], tree["points"]
+    best_d, best_i = np.zeros(0, np.float32), np.zeros(0, np.int64)
+    kth = np.inf
+    stack = [(0, 0.0)]
+    while stack:
+        i, bound = stack.pop()
+        if bound >= kth:
+            continue
+        if left[i] < 0:
+            idx = np.arange(start[i], stop[i])
+            if skip is not None:
+                idx = idx[~skip[idx]]
+            d = ((points[idx] - q) ** 2).sum(axis=1)
+            best_d, best_i = _merge(best_d, best_i, d, idx, k)
+            if len(best_d) == k:
+                kth = best_d.max()
+            continue
+        diff = float(q[dim[i]] - val[i])
+        near, far = (left[i], right[i]) if diff < 0 else (right[i], left[i])
+        stack.append((far, max(bound, diff * diff)))
+        stack.append((near, bound))
+    return best_d, best_i
+
+# ======================== INDEX ========================
+class NeighbourIndex:
+    def __init__(self, X:np.ndarray, ids:np.ndarray, shunts:np.ndarray, version=None, rebuild_at:float=0.05):
+        self.version = version          # store version the tree was built from
+        self.rebuild_at = rebuild_at    # rebuild once the buffer exceeds this fraction of the tree
+        self._lock = threading.Lock()
+        self._build(X, np.asarray(ids).astype(str), np.asarray(shunts, np.uint8))
+
+    def _build(self, X, ids, shunts):
+        tree = build_tree(X)
+        self._set(tree, ids[tree["perm"]], shunts[tree["perm"]])
+
+    def _set(self, tree, ids, shunts):
+        # ids/shunts are in tree order
+        self.tree, self.ids, self.shunts = tree, ids, shunts
+        self.dead = np.zeros(len(ids), bool)
+        self._pos = {pid: i for i, pid in enumerate(self.ids.tolist())}
+        self.buf_X, self.buf_ids, self.buf_shunts = [], [], []
+
+    @classmethod
+    def from_store(cls, store:PatientStore, version=None):
+        return cls(store_features(store), store.column("patient_id"), store.column("shunt_mm"), version)
+
+    def __len__(self):
+        return len(self.ids) - int(self.dead.sum()) + len(self.buf_ids)
+
+    def memory_usage(self)->int:
+        return (sum(a.nbytes for a in self.tree.values()) + self.ids.nbytes + self.shunts.nbytes + self.dead.nbytes
+                + sys.getsizeof(self._pos) + len(self._pos) * sys.getsizeof("100000000"))
+
+    # ---- updates ----
+    def upsert(self, rec:dict):
+        # Add a patient or re-place an edited one; its old entry is tombstoned.
+        pid, x, shunt = str(rec["patient_id"]), features(rec), SHUNT_SIZES.index(rec["shunt_mm"])
+        with self._lock:
+            pos = self._pos.get(pid)
+            if pos is not None and not self.dead[pos] and np.array_equal(self.tree["points"][pos], x) \
+                    and self.shunts[pos] == shunt:
+                return
+            if pos is not None:
+                self.dead[pos] = True
+            if pid in self.buf_ids:
+                i = self.buf_ids.index(pid)
+                self.buf_X[i], self.buf_shunts[i] = x, shunt
+            else:
+                self.buf_X.append(x); self.buf_ids.append(pid); self.buf_shunts.append(shunt)
+            if len(self.buf_ids) > max(256, self.rebuild_at * len(self.ids)):
+                self._compact()
+
+    def _compact(self):
+        live = ~self.dead
+        self._build(np.concatenate([self.tree["points"][live], np.array(self.buf_X, np.float32).reshape(-1, len(FEATURES))]),
+                    np.concatenate([self.ids[live], np.array(self.buf_ids, dtype=self.ids.dtype)]),
+                    np.concatenate([self.shunts[live], np.array(self.buf_shunts, np.uint8)]))
+
+    # ---- queries ----
+    def query(self, rec:dict, k:int=50):
+        # (patient ids, shunt codes, weights at surgery, distances) of the k most similar
+        # other patients, nearest first
+        q, pid = features(rec), str(rec["patient_id"])
+        with self._lock:
+            skip = self.dead
+            pos = self._pos.get(pid)
+            if pos is not None and not skip[pos]:
+                skip = skip.copy()
+                skip[pos] = True
+            d, i = query_tree(self.tree, q, k, skip)
+            X, ids, shunts = self.tree["points"][i], self.ids[i], self.shunts[i]
+            if self.buf_ids:
+                others = [j for j, b in enumerate(self.buf_ids) if b != pid]
+                bX = np.array(self.buf_X, np.float32).reshape(-1, len(FEATURES))[others]
+                d = np.concatenate([d, ((bX - q) ** 2).sum(axis=1)])
+                X = np.concatenate([X, bX])
+                ids = np.concatenate([ids, np.array(self.buf_ids)[others].astype(ids.dtype)])
+                shunts = np.concatenate([shunts, np.array(self.buf_shunts, np.uint8)[others]])
+        order = np.argsort(d, kind="stable")[:k]
+        return ids[order], shunts[order], X[order, 0] * SCALES[0], np.sqrt(d[order])
+
+    # ---- persistence ----
+    def save(self, path:str):
+        with self._lock:
+            if self.buf_ids or self.dead.any():
+                self._compact()
+            self._save(path)
+
+    def _save(self, path:str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, ids=self.ids, shunts=self.shunts, version=np.array(-1 if self.version is None else self.version),
+                 **self.tree)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path:str):
+        data = np.load(path)
+        index = cls.__new__(cls)
+        index.version = None if int(data["version"]) == -1 else int(data["version"])
+        index.rebuild_at = 0.05
+        index._lock = threading.Lock()
+        index._set({k: data[k] for k in TREE_ARRAYS}, data["ids"], data["shunts"])
+        return index
+
+def open_index(store:PatientStore)->NeighbourIndex:
+    # The persisted index when it matches the store, else a fresh build saved for next time.
+    path, version = os.path.join(store.path, INDEX_FILE), store_version(store.path)
+    if os.path.exists(path):
+        try:
+            index = NeighbourIndex.load(path)
+        except (OSError, ValueError, KeyError):
+            index = None  # unreadable or from an older layout; rebuild it
+        if index is not None and index.version == version:
+            return index
+    index = NeighbourIndex.from_store(store, version)
+    try:
+        index.save(path)
+    except OSError:
+        pass  # read-only store; rebuild next time
+    return index
+
+SHUNT_MM = np.array([float(s.split()[0]) for s in SHUNT_SIZES])
+
+def shunt_summary(patient:dict, shunts:np.ndarray, weights:np.ndarray)->dict:
+    # Shunt size distribution among the neighbours, their most common size, and the
+    # percentile of this patient's shunt:weight ratio (mm/kg) among theirs.
+    counts = np.bincount(shunts, minlength=len(SHUNT_SIZES))
+    ratios = SHUNT_MM[shunts] / np.maximum(weights, 0.1)
+    ratio = SHUNT_MM[SHUNT_SIZES.index(patient["shunt_mm"])] / max(float(patient["weight_kg"]), 0.1)
+    percentile = 100 * ((ratios < ratio).sum() + 0.5 * (ratios == ratio).sum()) / max(1, len(ratios))
+    return dict(n=len(shunts), pcts=[round(100 * c / max(1, len(shunts)), 1) for c in counts.tolist()],
+                common=SHUNT_SIZES[int(counts.argmax())], ratio=float(ratio), percentile=float(percentile))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the comparable-patient index for a store")
+    ap.add_argument("store", help="patient store directory (see patients.py)")
+    ap.add_argument("--bench", action="store_true", help="time k-NN queries after building")
+    ap.add_argument("-k", type=int, default=50)
+    args = ap.parse_args(argv)
+    store = PatientStore(args.store)
+    t0 = time.perf_counter()
+    index = NeighbourIndex.from_store(store, store_version(store.path))
+    index.save(os.path.join(args.store, INDEX_FILE))
+    print(f"indexed {len(index):,} patients in {time.perf_counter() - t0:.2f}s")
+    if args.bench:
+        rows = np.random.default_rng(0).integers(0, len(store), 200)
+        recs = [store.record(r) for r in rows]
+        t0 = time.perf_counter()
+        for rec in recs:
+            index.query(rec, args.k)
+        print(f"k={args.k}: {(time.perf_counter() - t0) / len(recs) * 1000:.2f} ms per query")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
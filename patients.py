@@ -0,0 +1,175 @@
+# patients.py
+# Columnar patient repository: one memory-mapped .npy file per column,
+# a patient_id -> row index, and per-row materialization for the dashboard.
+import os
+import sys
+import threading
+from datetime import date
+
+import numpy as np
+
+GENDERS = ["F", "M", "Intersex", "Other"]
+BMI_CATS = ["Underweight", "Normal", "Overweight", "Obese"]
+TAPVR = ["No", "Yes"]
+GENETIC = ["No abnormality", "Downs", "Turner", "DiGeorge", "Williams"]
+SHUNT_SIZES = ["5.0 mm", "4.0 mm", "3.5 mm", "3.0 mm"]
+
+# Categorical columns are stored as uint8 codes into these tables.
+CATEGORIES = dict(gender=GENDERS, bmi_cat=BMI_CATS, tapvr=TAPVR, genetic=GENETIC, shunt_mm=SHUNT_SIZES)
+
+SCHEMA = dict(
+    patient_id="U16",
+    dob="datetime64[D]",
+    gender="u1",
+    race_eth="U32",
+    weight_current="f4",
+    gest_weeks="u1",
+    gest_days="u1",
+    is_premature="?",
+    base_risk="u1",
+    date_of_surg="datetime64[D]",
+    age_months="u1",
+    age_days="u1",
+    weight_kg="f4",
+    bmi_cat="u1",
+    cpb_time="u2",
+    tapvr="u1",
+    genetic="u1",
+    shunt_mm="u1",
+)
+
+# ======================== STORE ========================
+class PatientStore:
+    def __init__(self, path:str):
+        self.path = path
+        self._columns = {}
+        self._index = None
+        self._lock = threading.Lock()
+        missing = [c for c in SCHEMA if not os.path.exists(self._file(c))]
+        if missing:
+            raise FileNotFoundError(f"patient store {path!r} is missing columns: {', '.join(missing)}")
+        # Map every column now: a mapping keeps the file it was opened on, so a later
+        # write_store (which replaces the files) can't change this store underneath it.
+        self._n = len(self.column("patient_id"))
+        short = [f"{c} has {len(self.column(c))}" for c in SCHEMA if len(self.column(c)) != self._n]
+        if short:
+            raise ValueError(f"patient store {path!r} is being rewritten or is damaged: "
+                             f"{self._n} patient ids but {', '.join(short)} rows")
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.npy")
+
+    def __len__(self):
+        return self._n
+
+    def column(self, name:str)->np.ndarray:
+        # Columns are mapped on first access; the OS pages rows in as they're read.
+        col = self._columns.get(name)
+        if col is None:
+            col = self._columns[name] = np.load(self._file(name), mmap_mode="r")
+        return col
+
+    @property
+    def index(self)->dict:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    ids = self.column("patient_id").tolist()
+                    self._index = dict(zip(ids, range(len(ids))))
+        return self._index
+
+    def row_of(self, patient_id:str):
+        return self.index.get(str(patient_id))
+
+    def __contains__(self, patient_id):
+        return self.row_of(patient_id) is not None
+
+    def record(self, row:int)->dict:
+        # Materialize one row into the plain Python values the widgets expect.
+        rec = {}
+        for name, kind in SCHEMA.items():
+            val = self.column(name)[row]
+            if name in CATEGORIES:
+                val = CATEGORIES[name][int(val)]
+            elif kind.startswith("datetime64"):
+                val = val.astype(date)
+            elif kind == "f4":
+                val = round(val.item(), 2)  # drop float32 noise (4.0999999 -> 4.1)
+            else:
+                val = val.item()
+            rec[name] = val
+        return rec
+
+    def get(self, patient_id:str):
+        row = self.row_of(patient_id)
+        return None if row is None else self.record(row)
+
+    def memory_usage(self)->dict:
+        # Mapped bytes live in the OS page cache (shared); the id index is private heap.
+        index = 0
+        if self._index is not None:
+            index = sys.getsizeof(self._index) + self._n * (sys.getsizeof("100000000") + sys.getsizeof(self._n))
+        return dict(mapped=sum(c.nbytes for c in self._columns.values()), index=index)
+
+def write_store(path:str, columns:dict):
+    # Each column goes to a temp file that replaces the old one, so stores already open keep
+    # reading the files they mapped. patient_id goes last: it is the store's version stamp.
+    cols, n = {}, None
+    for name, kind in SCHEMA.items():
+        col = np.asarray(columns[name])
+        if name in CATEGORIES and col.dtype.kind in "OU":
+            lookup = {v: i for i, v in enumerate(CATEGORIES[name])}
+            col = np.array([lookup[v] for v in col])
+        col = col.astype(kind)
+        if n is not None and len(col) != n:
+            raise ValueError(f"column {name!r} has {len(col)} rows, expected {n}")
+        n = len(col)
+        cols[name] = col
+    os.makedirs(path, exist_ok=True)
+    for name in [c for c in SCHEMA if c != "patient_id"] + ["patient_id"]:
+        tmp = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp, cols[name])
+        os.replace(tmp, os.path.join(path, f"{name}.npy"))
+
+def store_version(path:str)->int:
+    # Changes whenever the store is rewritten (write_store replaces patient_id last).
+    return os.stat(os.path.join(path, "patient_id.npy")).st_mtime_ns
+
+# ======================== DEMO DATA ========================
+RACES = ["Hispanic/Latino", "White", "Black", "Asian", "Other"]
+
+def demo_columns(n:int, seed:int=0)->dict:
+    rng = np.random.default_rng(seed)
+    today = np.datetime64("2025-10-18")
+    age_days = rng.integers(0, 365*2, n)
+    surg_age = np.minimum(rng.integers(0, 180, n), age_days)
+    gest = rng.integers(24*7, 41*7, n)
+    weight = np.round(rng.normal(5.0, 1.5, n).clip(1.5, 15.0), 1)
+    return dict(
+        patient_id=np.arange(100000000, 100000000 + n).astype("U16"),
+        dob=today - age_days,
+        gender=rng.integers(0, len(GENDERS), n),
+        race_eth=np.array(RACES)[rng.integers(0, len(RACES), n)],
+        weight_current=weight,
+        gest_weeks=gest // 7,
+        gest_days=gest % 7,
+        is_premature=gest < 37*7,
+        base_risk=rng.integers(10, 90, n),
+        date_of_surg=today - age_days + surg_age,
+        age_months=surg_age // 30,
+        age_days=surg_age % 30,
+        weight_kg=np.round((weight - rng.uniform(0, 1.0, n)).clip(1.5), 1),
+        bmi_cat=rng.choice(len(BMI_CATS), n, p=[0.3, 0.45, 0.15, 0.1]),
+        cpb_time=rng.integers(0, 240, n),
+        tapvr=rng.choice(len(TAPVR), n, p=[0.85, 0.15]),
+        genetic=rng.choice(len(GENETIC), n, p=[0.8, 0.05, 0.04, 0.06, 0.05]),
+        # larger babies get larger shunts, with some spread between sizes
+        shunt_mm=(3 - np.digitize(weight + rng.normal(0, 0.5, n), [3.5, 4.5, 6.0])).clip(0, 3),
+    )
+
+if __name__ == "__main__":
+    # python patients.py <n_patients> <store_dir>
+    if len(sys.argv) != 3:
+        sys.exit("usage: python patients.py <n_patients> <store_dir>")
+    write_store(sys.argv[2], demo_columns(int(sys.argv[1])))
+    print(f"wrote {sys.argv[1]} patients to {sys.argv[2]}")
@@ -0,0 +1,100 @@
+# perf.py
+# Per-section instrumentation for the dashboard: wall time, markdown bytes and
+# render-cache hits for each block, per session and process-wide.
+#
+# Sections are always timed (it's a few microseconds). The diagnostics panel and
+# the JSONL log are opt-in: DASHBOARD_DIAGNOSTICS=1 or ?diagnostics=1 in the URL,
+# with DASHBOARD_METRICS_LOG=<path> to append one JSON line per section render.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import charts
+
+SECTIONS_KEY = "_perf_sections"
+LOG_PATH = os.environ.get("DASHBOARD_METRICS_LOG")
+
+_active = threading.local()  # stack of open section records for the running script thread
+_totals = {}                 # section -> dict(count, ms, bytes, cache_hits, cache_misses)
+_lock = threading.Lock()
+
+def enabled()->bool:
+    return os.environ.get("DASHBOARD_DIAGNOSTICS") == "1" or st.query_params.get("diagnostics") == "1"
+
+def _session_id()->str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "-"
+
+@contextmanager
+def section(name:str):
+    rec = dict(ms=0.0, bytes=0, cache_hits=0, cache_misses=0)
+    stack = _active.__dict__.setdefault("stack", [])
+    stack.append(rec)
+    cache0 = charts.cache_stats()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["ms"] = (time.perf_counter() - t0) * 1000.0
+        stack.pop()
+        # render cache is process-wide, so concurrent sessions can leak into these deltas
+        cache1 = charts.cache_stats()
+        rec["cache_hits"] = cache1["hits"] - cache0["hits"]
+        rec["cache_misses"] = cache1["misses"] - cache0["misses"]
+        st.session_state.setdefault(SECTIONS_KEY, {})[name] = rec
+        with _lock:
+            tot = _totals.setdefault(name, dict(count=0, ms=0.0, bytes=0, cache_hits=0, cache_misses=0))
+            tot["count"] += 1
+            for k in ("ms", "bytes", "cache_hits", "cache_misses"):
+                tot[k] += rec[k]
+        if LOG_PATH and enabled():
+            _log(name, rec)
+
+def markdown(body:str):
+    # st.markdown(unsafe_allow_html=True), counting the bytes against the open section
+    stack = getattr(_active, "stack", None)
+    if stack:
+        stack[-1]["bytes"] += len(body.encode("utf-8"))
+    st.markdown(body, unsafe_allow_html=True)
+
+def section_metrics()->dict:
+    # {section name: metrics of its last render in this session}
+    return {k: dict(v) for k, v in st.session_state.get(SECTIONS_KEY, {}).items()}
+
+# ======================== EXPORT ========================
+def _log(name:str, rec:dict):
+    line = json.dumps(dict(ts=time.time(), session=_session_id(), section=name, **rec))
+    with _lock, open(LOG_PATH, "a") as f:
+        f.write(line + "\n")
+
+def prometheus_text()->str:
+    with _lock:
+        totals = {k: dict(v) for k, v in _totals.items()}
+    cache = charts.cache_stats()
+    out = ["# HELP dashboard_section_render_seconds Wall time spent rendering each dashboard section.",
+           "# TYPE dashboard_section_render_seconds summary"]
+    for name, t in sorted(totals.items()):
+        out.append(f'dashboard_section_render_seconds_sum{{section="{name}"}} {t["ms"] / 1000.0:.6f}')
+        out.append(f'dashboard_section_render_seconds_count{{section="{name}"}} {t["count"]}')
+    out += ["# HELP dashboard_section_markdown_bytes_total Markdown bytes emitted by each section.",
+            "# TYPE dashboard_section_markdown_bytes_total counter"]
+    out += [f'dashboard_section_markdown_bytes_total{{section="{name}"}} {t["bytes"]}' for name, t in sorted(totals.items())]
+    out += ["# HELP dashboard_render_cache_requests_total SVG render cache lookups by result.",
+            "# TYPE dashboard_render_cache_requests_total counter",
+            f'dashboard_render_cache_requests_total{{result="hit"}} {cache["hits"]}',
+            f'dashboard_render_cache_requests_total{{result="miss"}} {cache["misses"]}',
+            "# HELP dashboard_render_cache_entries SVG render cache entries.",
+            "# TYPE dashboard_render_cache_entries gauge",
+            f'dashboard_render_cache_entries {cache["size"]}']
+    return "\n".join(out) + "\n"
+
+def jsonl_snapshot()->str:
+    # This session's last render of every section, one JSON object per line
+    session, ts = _session_id(), time.time()
+    return "".join(json.dumps(dict(ts=ts, session=session, section=k, **v)) + "\n"
+                   for k, v in sorted(section_metrics().items()))
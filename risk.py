@@ -0,0 +1,75 @@
+# risk.py
+# Vectorized risk scoring: one NumPy pass over whole cohorts, same rule for one patient.
+import numpy as np
+
+from patients import BMI_CATS, TAPVR
+
+# Points added to base risk. Scalars are per unit (per kg, per CPB minute);
+# bmi_cat has one entry per BMI_CATS category.
+DEFAULT_COEFFICIENTS = dict(
+    premature=15.0,
+    weight_kg=0.0,
+    cpb_time=0.0,
+    tapvr=0.0,
+    bmi_cat=(0.0, 0.0, 0.0, 0.0),
+)
+
+def score_cohort(base_risk, is_premature, weight_kg=0.0, cpb_time=0.0, tapvr=0, bmi_cat=0,
+                 coefficients:dict=None)->np.ndarray:
+    # All inputs broadcast; tapvr and bmi_cat are category codes. Returns int risk % in [0, 100].
+    coef = {**DEFAULT_COEFFICIENTS, **(coefficients or {})}
+    risk = np.asarray(base_risk, dtype=np.float64).copy()
+    risk += coef["premature"] * np.asarray(is_premature, dtype=bool)
+    if coef["weight_kg"]:
+        risk += coef["weight_kg"] * np.asarray(weight_kg, dtype=np.float64)
+    if coef["cpb_time"]:
+        risk += coef["cpb_time"] * np.asarray(cpb_time, dtype=np.float64)
+    if coef["tapvr"]:
+        risk += coef["tapvr"] * (np.asarray(tapvr) == 1)
+    bmi = np.asarray(coef["bmi_cat"], dtype=np.float64)
+    if bmi.any():
+        risk += bmi[np.asarray(bmi_cat, dtype=np.intp)]
+    return np.clip(risk, 0, 100).astype(np.int16)
+
+def score_patient(base_risk, is_premature, weight_kg=0.0, cpb_time=0, tapvr="No", bmi_cat="Underweight",
+                  coefficients:dict=None)->int:
+    return int(score_cohort(base_risk, is_premature, weight_kg, cpb_time,
+                            TAPVR.index(tapvr), BMI_CATS.index(bmi_cat), coefficients))
+
+def score_record(rec:dict, coefficients:dict=None)->int:
+    # score_patient for a materialized patient record
+    return score_patient(rec["base_risk"], rec["is_premature"], rec["weight_kg"], rec["cpb_time"],
+                         rec["tapvr"], rec["bmi_cat"], coefficients)
+
+def score_store(store, coefficients:dict=None)->np.ndarray:
+    # Scores every row of a PatientStore straight from its mapped columns.
+    c = store.column
+    return score_cohort(c("base_risk"), c("is_premature"), c("weight_kg"), c("cpb_time"),
+                        c("tapvr"), c("bmi_cat"), coefficients)
+
+def top_k(scores:np.ndarray, k:int)->np.ndarray:
+    # Row indices of the k highest scores, highest first, without a full sort. Ties go to the
+    # lower row, so one changed score can't reshuffle which tied patients make the cut.
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+    above = np.flatnonzero(scores > kth)
+    idx = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    return idx[np.argsort(-scores[idx].astype(np.int64), kind="stable")]
+
+def stable_slots(slots:list, members)->list:
+    # Lay `members` out so each one already in `slots` keeps its place; newcomers take the
+    # vacated slots, then new ones at the end, in the order given. Holes left when there are
+    # fewer members than before are filled from the end.
+    keep = set(members)
+    out = [m if m in keep else None for m in slots]
+    placed = set(out)
+    new = iter([m for m in members if m not in placed])
+    out = [next(new, None) if m is None else m for m in out]
+    out += list(new)
+    while None in out:
+        last = out.pop()
+        if last is not None:
+            out[out.index(None)] = last
+    return out
@@ -0,0 +1,244 @@
+# shared.py
+# Process-wide cohort data shared by every dashboard session.
+#
+# One SharedCohort per store (held with st.cache_resource) owns versioned,
+# read-only snapshots of it: the mapped columns, the cohort counters, the
+# comparable-patient index, the complication event log and a bounded LRU of
+# materialized patient records.
+# Sessions never copy them. Each
+# session keeps a SessionOverlay with just the fields it has edited, applied on
+# top of the snapshot whenever it reads a patient or counts the cohort
+# (copy-on-write). Those edits never touch the shared structures.
+#
+# When the store directory is writable, edits also go to its durable edit log
+# (edits.py). Those committed edits are shared: every snapshot applies them on
+# top of the store rows, the counters, the risk scores and the neighbour index, and a reload
+# starts from them. Each session writes only the fields it changed since it last
+# read the patient, and the shared structures are then refreshed from the
+# committed record, never from a session's own copy of it.
+#
+# A snapshot is replaced when the store files change on disk. Sessions move to
+# the new one on their next rerun, and the old one is dropped once no session
+# still reads it.
+import sys
+import threading
+import time
+import weakref
+
+from charts import RenderCache
+from cohort import CohortAggregates
+from edits import open_edit_log
+from events import open_events
+from neighbours import open_index
+from patients import PatientStore, store_version
+from risk import score_record, score_store
+
+def _sizeof(rec:dict)->int:
+    # heap size of a flat dict of plain values
+    return sys.getsizeof(rec) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in rec.items())
+
+class Snapshot:
+    # One version of the store. Records handed out are shared; copy before changing them.
+    def __init__(self, path:str, version:int, max_records:int, edits=None):
+        self.path = path
+        self.version = version
+        self.edits = edits  # shared EditLog, or None
+        self.store = PatientStore(path)
+        self.aggregates = CohortAggregates(self.store)
+        self.records = RenderCache(max_records)  # patient_id -> materialized store row
+        self.created = time.time()
+        self.commits = 0      # committed edits applied since the snapshot was built
+        self._neighbours = None
+        self._scores = None
+        self._events = False  # not opened yet; None once we know there is no event log
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()  # orders refreshes of the shared structures after commits
+        self._record_bytes = _sizeof(self.store.record(0)) if len(self.store) else 0
+        for rec in self._committed():
+            self.aggregates.upsert(rec)
+
+    def record(self, patient_id:str):
+        row = self.store.row_of(patient_id)
+        if row is None:
+            return None
+        rec = self.records.get_or_render(str(patient_id), lambda: self.store.record(row))
+        committed = self.edits.get(patient_id) if self.edits is not None else None
+        return {**rec, **committed} if committed else rec
+
+    def _committed(self):
+        # records of store patients with committed edits
+        for patient_id, _ in self.edits.items() if self.edits is not None else ():
+            rec = self.record(patient_id)
+            if rec is not None:
+                yield rec
+
+    @property
+    def neighbours(self):
+        # comparable-patient index, loaded (or built and saved) on first use
+        if self._neighbours is None:
+            with self._lock:
+                if self._neighbours is None:
+                    index = open_index(self.store)
+                    with self._commit_lock:
+                        for rec in self._committed():
+                            index.upsert(rec)
+                        self._neighbours = index
+        return self._neighbours
+
+    def commit(self, patient_id:str):
+        # Bring the shared counters and index in line with the patient's committed record.
+        # Under the lock the record read is at least as new as any commit before it, so
+        # refreshes racing for one patient end on its latest state.
+        with self._commit_lock:
+            rec = self.record(patient_id)
+            if rec is None:
+                return
+            self.aggregates.upsert(rec)
+            if self._neighbours is not None:
+                self._neighbours.upsert(rec)
+            if self._scores is not None:
+                self._scores[self.store.row_of(patient_id)] = score_record(rec)
+            self.commits += 1
+
+    def scores(self):
+        # Risk % for every stored patient (by row) with committed edits applied; kept
+        # current by commit(). Shared, so don't modify it.
+        if self._scores is None:
+            with self._commit_lock:
+                if self._scores is None:
+                    scores = score_store(self.store)
+                    for rec in self._committed():
+                        scores[self.store.row_of(rec["patient_id"])] = score_record(rec)
+                    self._scores = scores
+        return self._scores
+
+    @property
+    def events(self):
+        # complication event log beside the store, or None
+        if self._events is False:
+            with self._lock:
+                if self._events is False:
+                    self._events = open_events(self.path)
+        return self._events
+
+    def memory_usage(self)->dict:
+        store = self.store.memory_usage()
+        return dict(mapped=store["mapped"], index=store["index"], aggregates=self.aggregates.memory_usage(),
+                    records=self.records.stats()["size"] * self._record_bytes,
+                    neighbours=self._neighbours.memory_usage() if self._neighbours is not None else 0)
+
+class SessionOverlay:
+    # One session's edits: patient_id -> {field: value} for fields that differ from the snapshot.
+    # With an edit log the edits are written through to it instead and the overlay stays empty.
+    def __init__(self, log=None):
+        self.snapshot = None
+        self.log = log
+        self.edits = {}
+        self._seen = {}  # patient_id -> the record as this session last read or wrote it
+
+    def get(self, patient_id:str):
+        # The patient as this session sees it, as a fresh dict, or None if unknown.
+        base = self.snapshot.record(patient_id) if self.snapshot is not None else None
+        edits = self.edits.get(str(patient_id))
+        if base is None and edits is None:
+            return None
+        rec = {**(base or {}), **(edits or {})}
+        self._seen = {str(patient_id): rec}
+        return dict(rec)
+
+    def edit(self, rec:dict)->dict:
+        # Keep (or log) only what changed since this session read the patient; returns that diff.
+        # Comparing with what the session saw, not the latest committed record, stops a
+        # session still showing old values from reverting another session's edit.
+        patient_id = str(rec["patient_id"])
+        base = self.snapshot.record(patient_id) if self.snapshot is not None else None
+        seen = self._seen.get(patient_id, base)
+        diff = {k: v for k, v in rec.items() if seen is None or seen.get(k) != v}
+        if seen is not None:
+            diff.pop("patient_id", None)
+        if not diff:
+            return diff
+        self._seen = {patient_id: {**(seen or {}), **diff}}
+        if self.log is not None and base is not None:
+            self.log.append(patient_id, diff)
+            self.snapshot.commit(patient_id)
+        else:
+            self.edits[patient_id] = {**self.edits.get(patient_id, {}), **diff}
+        return diff
+
+    def counts(self, **filters):
+        # The snapshot's cohort counts with this session's own edits swapped in.
+        counts, shunt_counts = self.snapshot.aggregates.counts(**filters)
+        if not self.edits:
+            return counts, shunt_counts
+        delta = CohortAggregates()
+        for patient_id, edits in list(self.edits.items()):
+            base = self.snapshot.record(patient_id)
+            delta.replace(base, {**(base or {}), **edits})
+        dc, ds = delta.counts(**filters)
+        return [a + b for a, b in zip(counts, dc)], [a + b for a, b in zip(shunt_counts, ds)]
+
+    def memory_usage(self)->int:
+        return sys.getsizeof(self.edits) + sum(_sizeof(d) for d in list(self.edits.values()))
+
+class SharedCohort:
+    def __init__(self, path:str, max_records:int=4096, recheck_s:float=1.0):
+        self.path = path
+        self.max_records = max_records
+        self.recheck_s = recheck_s
+        self._snapshot = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._snapshots = weakref.WeakSet()  # every snapshot a session still reads
+        self._overlays = weakref.WeakSet()   # one per live session; gone with its session state
+        self.edits = open_edit_log(path)     # durable edits, or None for a read-only store
+
+    def _version(self)->int:
+        return store_version(self.path)
+
+    def current(self)->Snapshot:
+        if self._snapshot is None or time.monotonic() - self._checked > self.recheck_s:
+            with self._lock:
+                version = self._version()
+                if self._snapshot is None or version != self._snapshot.version:
+                    try:
+                        self._snapshot = Snapshot(self.path, version, self.max_records, self.edits)
+                    except ValueError:
+                        if self._snapshot is None:
+                            raise
+                        # caught mid-rewrite: keep serving the old snapshot and try again next check
+                    else:
+                        self._snapshots.add(self._snapshot)
+                self._checked = time.monotonic()
+        return self._snapshot
+
+    def session(self, overlay:SessionOverlay=None)->SessionOverlay:
+        # Pin a session's overlay (a new one the first time) to the current snapshot.
+        if overlay is None:
+            overlay = SessionOverlay(self.edits)
+            with self._lock:
+                self._overlays.add(overlay)
+        overlay.snapshot = self.current()
+        overlay.log = self.edits
+        return overlay
+
+    def close(self):
+        # Commit and stop the edit log writer (when the cached resource is released).
+        if self.edits is not None:
+            self.edits.close()
+
+    def memory_usage(self)->dict:
+        # Byte estimates across every live snapshot and session overlay.
+        current = self.current()
+        with self._lock:
+            snapshots, overlays = list(self._snapshots), list(self._overlays)
+        usage = dict(version=current.version, snapshots=len(snapshots), patients=len(current.store),
+                     sessions=len(overlays), edited_patients=sum(len(o.edits) for o in overlays),
+                     committed_patients=len(self.edits) if self.edits is not None else 0,
+                     mapped=0, index=0, aggregates=0, records=0, neighbours=0)
+        for snap in snapshots:
+            for k, v in snap.memory_usage().items():
+                usage[k] += v
+        usage["edits"] = sum(o.memory_usage() for o in overlays)
+        usage["heap"] = usage["index"] + usage["aggregates"] + usage["records"] + usage["neighbours"] + usage["edits"]
+        return usage
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from api import ApiServer
+from edits import open_edit_log
+from patients import demo_columns, write_store
+
+@pytest.fixture
+def server(tmp_path):
+    write_store(str(tmp_path), demo_columns(500, seed=3))
+    server = ApiServer(str(tmp_path))
+    server.cohort.recheck_s = 0.0  # see the edit log on every request
+    return server
+
+def test_conditional_get(server):
+    pid = server.cohort.store.column("patient_id")[7]
+    status, ctype, body, etag = server.respond("GET", f"/patients/{pid}/risk.json", {})
+    assert status == 200 and ctype == "application/json" and json.loads(body)["patient_id"] == pid
+    assert etag.startswith('"') and etag.endswith('"')
+    assert server.respond("GET", f"/patients/{pid}/risk.json", {"if-none-match": etag}) == (304, ctype, b"", etag)
+    assert server.respond("GET", f"/patients/{pid}/risk.json", {"if-none-match": f'"x", {etag}'})[0] == 304
+    assert server.respond("GET", f"/patients/{pid}/risk.json", {"if-none-match": '"x"'})[0] == 200
+    assert server.respond("POST", f"/patients/{pid}/risk.json", {})[0] == 405
+
+def test_query_strings_share_entries(server):
+    pid = server.cohort.store.column("patient_id")[7]
+    plain = server.respond("GET", f"/patients/{pid}/gauge.svg", {})
+    assert server.respond("GET", f"/patients/{pid}/gauge.svg?utm=1&x=2", {}) == plain
+    compact = server.respond("GET", f"/patients/{pid}/gauge.svg?compact=1", {})
+    assert compact[0] == 200 and compact[3] != plain[3]
+    assert server.responses.stats()["size"] == 2
+
+def test_not_found_is_not_cached(server):
+    size = server.responses.stats()["size"]
+    for i in range(20):
+        status, _, body, etag = server.respond("GET", f"/patients/x{i}/risk.json", {})
+        assert status == 404 and etag is None
+    assert server.respond("GET", "/nope", {})[0] == 404
+    assert server.responses.stats()["size"] == size
+
+def test_etag_moves_with_committed_edits(server):
+    pid = server.cohort.store.column("patient_id")[7]
+    _, _, body, etag = server.respond("GET", f"/patients/{pid}/risk.json", {})
+    _, _, _, cohort_etag = server.respond("GET", "/cohort/genetic.svg", {})
+    log = open_edit_log(server.cohort.path)  # the dashboard's writer
+    genetic = "Downs" if server.cohort.record(pid)["genetic"] == "Turner" else "Turner"
+    log.append(pid, {"base_risk": 99, "genetic": genetic})
+    assert log.flush()
+    status, _, new_body, new_etag = server.respond("GET", f"/patients/{pid}/risk.json", {"if-none-match": etag})
+    assert status == 200 and new_etag != etag and json.loads(new_body)["base_risk"] == 99
+    assert server.respond("GET", "/cohort/genetic.svg", {"if-none-match": cohort_etag})[0] == 200
+    assert server.respond("GET", f"/patients/{pid}/risk.json", {"if-none-match": new_etag})[0] == 304
+    log.close()
@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from cohort import CohortAggregates
+from edits import open_edit_log
+from patients import GENDERS, GENETIC, SHUNT_SIZES, PatientStore, demo_columns, store_version, write_store
+from shared import SessionOverlay, Snapshot
+
+FILTERS = [dict(), dict(genders=["F"]), dict(genders=["M", "Other"], premature=True), dict(premature=False),
+           dict(date_from=date(2025, 3, 1)), dict(date_to=date(2025, 6, 30)),
+           dict(genders=["F", "Intersex"], premature=False, date_from=date(2024, 11, 1), date_to=date(2025, 8, 1))]
+
+@pytest.fixture
+def store(tmp_path):
+    write_store(str(tmp_path), demo_columns(3000, seed=2))
+    return PatientStore(str(tmp_path))
+
+def _brute(records, genders=None, premature=None, date_from=None, date_to=None):
+    # (genetic counts, shunt counts) by scanning every live record
+    genetic, shunt = [0] * (len(GENETIC) - 1), [0] * len(SHUNT_SIZES)
+    for rec in records.values():
+        if ((genders is None or rec["gender"] in genders) and (premature is None or rec["is_premature"] == premature)
+                and (date_from is None or rec["date_of_surg"] >= date_from)
+                and (date_to is None or rec["date_of_surg"] <= date_to)):
+            if rec["genetic"] != GENETIC[0]:
+                genetic[GENETIC.index(rec["genetic"]) - 1] += 1
+            shunt[SHUNT_SIZES.index(rec["shunt_mm"])] += 1
+    return genetic, shunt
+
+def _random_edit(rec, rng):
+    return dict(rec, gender=GENDERS[rng.integers(len(GENDERS))], is_premature=bool(rng.integers(2)),
+                date_of_surg=rec["date_of_surg"] + timedelta(days=int(rng.integers(-60, 60))),
+                genetic=GENETIC[rng.integers(len(GENETIC))], shunt_mm=SHUNT_SIZES[rng.integers(len(SHUNT_SIZES))])
+
+def test_counts_match_a_rescan(store):
+    records = {rec["patient_id"]: rec for rec in map(store.record, range(len(store)))}
+    agg = CohortAggregates(store)
+    for f in FILTERS:
+        assert agg.counts(**f) == _brute(records, **f)
+    rng = np.random.default_rng(0)
+    removed = []
+    for step in range(1500):
+        op = rng.integers(10)
+        if op < 6:                                   # edit a patient, sometimes one edited before
+            pid = str(rng.choice(list(records)))
+            records[pid] = _random_edit(records[pid], rng)
+            agg.upsert(records[pid])
+        elif op < 7:                                 # a no-op edit
+            agg.upsert(records[str(rng.choice(list(records)))])
+        elif op < 8:                                 # a new patient
+            rec = _random_edit(dict(store.record(int(rng.integers(len(store)))), patient_id=f"9{step:08d}"), rng)
+            records[rec["patient_id"]] = rec
+            agg.upsert(rec)
+        elif op < 9 or not removed:                  # remove a patient
+            pid = str(rng.choice(list(records)))
+            removed.append(records.pop(pid))
+            agg.remove(pid)
+            agg.remove(pid)                          # twice is once
+        else:                                        # bring a removed patient back
+            rec = removed.pop()
+            records[rec["patient_id"]] = rec
+            agg.upsert(rec)
+        if step % 250 == 0:
+            for f in FILTERS:
+                assert agg.counts(**f) == _brute(records, **f)
+    for f in FILTERS:
+        assert agg.counts(**f) == _brute(records, **f)
+
+def test_replace_is_a_correction(store):
+    agg = CohortAggregates(store)
+    old = store.record(10)
+    new = dict(old, is_premature=not old["is_premature"], genetic="Downs")
+    agg.replace(old, new)
+    records = {rec["patient_id"]: rec for rec in map(store.record, range(len(store)))}
+    records[old["patient_id"]] = new
+    for f in FILTERS:
+        assert agg.counts(**f) == _brute(records, **f)
+
+def _session(snapshot, log=None):
+    overlay = SessionOverlay(log)
+    overlay.snapshot = snapshot
+    return overlay
+
+def test_session_edits_stay_in_their_session(store):
+    # no edit log (a read-only store): edits live in the session's overlay only
+    snapshot = Snapshot(store.path, store_version(store.path), 64)
+    a, b = _session(snapshot), _session(snapshot)
+    records = {rec["patient_id"]: rec for rec in map(store.record, range(len(store)))}
+    shared = [snapshot.aggregates.counts(**f) for f in FILTERS]
+    rng = np.random.default_rng(1)
+    mine = dict(records)
+    for pid in rng.choice(list(records), 40, replace=False).tolist():
+        mine[pid] = _random_edit(a.get(pid), rng)
+        a.edit(mine[pid])
+    for f, before in zip(FILTERS, shared):
+        assert a.counts(**f) == _brute(mine, **f)
+        assert b.counts(**f) == _brute(records, **f)
+        assert snapshot.aggregates.counts(**f) == before
+
+def test_committed_edits_reach_every_session(store):
+    log = open_edit_log(store.path)
+    snapshot = Snapshot(store.path, store_version(store.path), 64, log)
+    a, b = _session(snapshot, log), _session(snapshot, log)
+    records = {rec["patient_id"]: rec for rec in map(store.record, range(len(store)))}
+    rng = np.random.default_rng(2)
+    for pid in rng.choice(list(records), 40, replace=False).tolist():
+        records[pid] = _random_edit(a.get(pid), rng)
+        a.edit(records[pid])
+    for f in FILTERS:
+        assert a.counts(**f) == b.counts(**f) == _brute(records, **f)
+    log.close()
+    reopened = Snapshot(store.path, store_version(store.path), 64, open_edit_log(store.path))
+    for f in FILTERS:
+        assert reopened.aggregates.counts(**f) == _brute(records, **f)
+    reopened.edits.close()
@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+from datetime import date
+
+import numpy as np
+import pytest
+
+from edits import EditLog, open_edit_log
+
+def _random_edits(n, seed):
+    rng = np.random.default_rng(seed)
+    return [(str(100 + int(p)), {"weight_kg": round(float(w), 1), "cpb_time": int(c)})
+            for p, w, c in zip(rng.integers(0, 300, n), rng.uniform(2, 12, n), rng.integers(30, 200, n))]
+
+def _merged(edits):
+    out = {}
+    for pid, fields in edits:
+        out.setdefault(pid, {}).update(fields)
+    return out
+
+def test_replay_after_compaction(tmp_path):
+    path = str(tmp_path / "edits.sqlite")
+    edits = _random_edits(5000, seed=0)
+    log = EditLog(path, compact_every=700, batch=64)
+    threads = [threading.Thread(target=lambda part: [log.append(p, f) for p, f in part], args=(edits[k::4],))
+               for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert log.flush()
+    log.close()
+    # threads interleave, so the reference is what the live log ended up holding
+    again = EditLog(path, compact_every=700)
+    assert dict(again.items()) == dict(log.items())
+    assert again.stats()["tail"] < 700 + 64
+    assert log.stats()["compactions"] >= 1
+    again.close()
+
+def test_reopen_matches_merged_state(tmp_path):
+    path = str(tmp_path / "edits.sqlite")
+    edits = _random_edits(3000, seed=1) + [("100", {"date_of_surg": date(2026, 3, 4)})]
+    log = EditLog(path, compact_every=1000)
+    for pid, fields in edits[:1500]:
+        log.append(pid, fields)
+    assert log.compact()
+    for pid, fields in edits[1500:]:
+        log.append(pid, fields)
+    log.close()
+    again = EditLog(path)
+    assert dict(again.items()) == _merged(edits)
+    assert again.get("100")["date_of_surg"] == date(2026, 3, 4)
+    again.close()
+
+def test_refresh_sees_other_writer(tmp_path):
+    path = str(tmp_path / "edits.sqlite")
+    writer, reader = EditLog(path, compact_every=10**9), EditLog(path)
+    edits = _random_edits(400, seed=2)
+    for pid, fields in edits[:200]:
+        writer.append(pid, fields)
+    assert writer.flush()
+    assert reader.refresh() == {pid for pid, _ in edits[:200]}
+    assert reader.refresh() == set()
+    for pid, fields in edits[200:]:
+        writer.append(pid, fields)
+    assert writer.compact()  # the reader's position is now behind the snapshot
+    generation = reader.generation
+    assert reader.refresh() == {pid for pid, _ in edits[200:]}
+    assert reader.generation > generation
+    assert dict(reader.items()) == _merged(edits)
+    writer.close()
+    reader.close()
+
+def test_writer_recovers_from_lock(tmp_path):
+    path = str(tmp_path / "edits.sqlite")
+    log = EditLog(path, busy_s=0.05)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    log.append("100", {"cpb_time": 90})
+    assert not log.flush(timeout=0.5)
+    assert log.stats()["error"] and log.stats()["pending"] == 1
+    other.execute("COMMIT")
+    other.close()
+    assert log.flush()
+    assert log.stats()["error"] is None and log.stats()["pending"] == 0
+    log.close()
+    assert EditLog(path).get("100") == {"cpb_time": 90}
+
+def test_readonly_log_reads_without_writing(tmp_path):
+    assert open_edit_log(str(tmp_path), readonly=True) is None
+    assert not list(tmp_path.iterdir())
+    writer = open_edit_log(str(tmp_path))
+    writer.append("100", {"cpb_time": 90})
+    assert writer.flush()
+    reader = open_edit_log(str(tmp_path), readonly=True)
+    assert reader.get("100") == {"cpb_time": 90}
+    writer.append("101", {"cpb_time": 45})
+    writer.flush()
+    assert reader.refresh() == {"101"}
+    with pytest.raises(ValueError, match="read-only"):
+        reader.append("100", {"cpb_time": 1})
+    with pytest.raises(ValueError, match="read-only"):
+        reader.compact()
+    assert [t.name for t in threading.enumerate()].count(f"edit-log:{reader.path}") == 1  # the writer's only
+    reader.close()
+    writer.close()
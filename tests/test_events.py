@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from events import N_STAGES, TAIL_FILE, EventStore, demo_events, write_events
+
+T0 = np.datetime64("2026-01-01T00:00:00", "s")
+
+def _random_events(n, seed):
+    rng = np.random.default_rng(seed)
+    return (np.array([str(100 + i) for i in rng.integers(0, 200, n)], "U16"),
+            rng.integers(0, N_STAGES, n).astype(np.uint8),
+            T0 + rng.integers(0, 90 * 86400, n).astype("timedelta64[s]"))
+
+def _brute(events):
+    # (stage patients, transition patients) by scanning every event in (patient, time) order
+    stage, trans = {}, {}
+    by_patient = {}
+    for pid, st, ts in sorted(events, key=lambda e: (e[0], e[2])):
+        stage.setdefault(st, []).append((ts, pid))
+        prev = by_patient.get(pid)
+        if prev is not None:
+            trans.setdefault((prev, st), []).append((ts, pid))
+        by_patient[pid] = st
+    return stage, trans
+
+def _within(rows, since, until):
+    return sorted({pid for ts, pid in rows if (since is None or ts >= since) and (until is None or ts <= until)})
+
+@pytest.mark.parametrize("tail", [0, 300])
+def test_queries_match_brute_force(tail):
+    pid, stage, ts = _random_events(3000, seed=tail)
+    log = EventStore(pid[:3000 - tail], stage[:3000 - tail], ts[:3000 - tail], compact_at=10000)
+    for p, s, t in zip(pid[3000 - tail:], stage[3000 - tail:], ts[3000 - tail:]):
+        log.add(p, int(s), t)
+    stages, trans = _brute(list(zip(pid.tolist(), stage.tolist(), ts)))
+    windows = [(None, None), (T0 + np.timedelta64(30, "D"), None), (T0 + np.timedelta64(20, "D"), T0 + np.timedelta64(50, "D"))]
+    for since, until in windows:
+        for s in range(N_STAGES):
+            assert log.stage_patients(s, since, until).tolist() == _within(stages.get(s, []), since, until)
+            for d in range(N_STAGES):
+                assert log.transition_patients(s, d, since, until).tolist() == _within(trans.get((s, d), []), since, until)
+    counts = np.zeros((N_STAGES, N_STAGES), int)
+    for (s, d), rows in trans.items():
+        counts[s, d] = len(rows)
+    np.testing.assert_array_equal(log.transition_counts(), counts)
+    np.testing.assert_array_equal(log.stage_counts(), np.bincount(stage, minlength=N_STAGES))
+    assert log.latest() == ts.max()
+
+def _open(path, compact_at=1024):
+    cols = {name: np.load(os.path.join(path, f"{name}.npy")) for name in ("patient_id", "stage", "ts")}
+    return EventStore(cols["patient_id"], cols["stage"], cols["ts"], str(path), compact_at=compact_at)
+
+def test_added_events_survive_reopen(tmp_path):
+    cols = demo_events(np.array([str(i) for i in range(100)]), np.full(100, np.datetime64("2026-01-01", "D")),
+                       until=T0 + np.timedelta64(60, "D"))
+    write_events(str(tmp_path), cols)
+    log = _open(tmp_path)
+    log.add("5", "Sepsis", T0 + np.timedelta64(70, "D"))
+    log.add("5", "Stroke", T0 + np.timedelta64(71, "D"))
+    with open(tmp_path / TAIL_FILE, "a") as f:
+        f.write("6,2,2026-03")  # torn by a crash mid-append
+    again = _open(tmp_path)
+    assert len(again) == len(log)
+    assert again.transition_patients("Sepsis", "Stroke", T0 + np.timedelta64(71, "D")).tolist() == ["5"]
+    np.testing.assert_array_equal(again.transition_counts(), log.transition_counts())
+    again.add("6", "Sepsis", T0 + np.timedelta64(72, "D"))
+    assert _open(tmp_path).stage_patients("Sepsis", T0 + np.timedelta64(72, "D")).tolist() == ["6"]
+
+def test_compaction_empties_tail_without_losing_events(tmp_path):
+    pid, stage, ts = _random_events(500, seed=3)
+    write_events(str(tmp_path), dict(patient_id=pid[:200], stage=stage[:200], ts=ts[:200]))
+    log = _open(tmp_path, compact_at=64)
+    for p, s, t in zip(pid[200:], stage[200:], ts[200:]):
+        log.add(p, int(s), t)
+    assert sum(1 for _ in open(tmp_path / TAIL_FILE)) == 300 % 64
+    again = _open(tmp_path, compact_at=64)
+    assert len(again) == 500
+    np.testing.assert_array_equal(again.transition_counts(), log.transition_counts())
+    # a crash between writing the columns and emptying the tail must not count events twice
+    with open(tmp_path / TAIL_FILE, "a") as f:
+        f.write(f"{pid[0]},{stage[0]},{ts[0]}\n")
+    assert len(_open(tmp_path, compact_at=64)) == 500
+
+def test_readonly_reader_leaves_a_torn_tail_alone(tmp_path):
+    pid, stage, ts = _random_events(100, seed=4)
+    write_events(str(tmp_path), dict(patient_id=pid, stage=stage, ts=ts))
+    _open(tmp_path).add("7", "Sepsis", T0 + np.timedelta64(95, "D"))
+    with open(tmp_path / TAIL_FILE, "a") as f:
+        f.write("8,2,2026-04-0")  # the writer is mid-append
+    before = (tmp_path / TAIL_FILE).read_bytes()
+    cols = {name: np.load(tmp_path / f"{name}.npy") for name in ("patient_id", "stage", "ts")}
+    reader = EventStore(cols["patient_id"], cols["stage"], cols["ts"], str(tmp_path), readonly=True)
+    assert len(reader) == 101
+    assert (tmp_path / TAIL_FILE).read_bytes() == before
+    with pytest.raises(ValueError, match="read-only"):
+        reader.add("9", "Sepsis", T0)
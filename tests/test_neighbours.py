@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from neighbours import NeighbourIndex, build_tree, features, open_index, query_tree, store_features
+from patients import PatientStore, demo_columns, write_store
+
+@pytest.fixture
+def store(tmp_path):
+    write_store(str(tmp_path), demo_columns(3000, seed=1))
+    return PatientStore(str(tmp_path))
+
+def _brute(X, ids, rec, k):
+    # sorted distances to the k nearest rows other than the patient itself
+    keep = ids != rec["patient_id"]
+    return np.sort(np.sqrt(((X[keep] - features(rec)) ** 2).sum(axis=1)))[:k]
+
+def test_tree_matches_brute_force():
+    X = np.random.default_rng(0).normal(size=(5000, 5)).astype(np.float32)
+    tree = build_tree(X, leaf_size=8)
+    for q in X[:50] + 0.1:
+        d, i = query_tree(tree, q, 20)
+        np.testing.assert_allclose(np.sort(d), np.sort(((X - q) ** 2).sum(axis=1))[:20], rtol=1e-6)
+        np.testing.assert_allclose(d, ((tree["points"][i] - q) ** 2).sum(axis=1))
+
+def test_query_matches_brute_force(store):
+    index = NeighbourIndex.from_store(store)
+    X, ids = store_features(store), store.column("patient_id")
+    for row in range(0, len(store), 97):
+        rec = store.record(row)
+        _, _, _, d = index.query(rec, k=25)
+        np.testing.assert_allclose(d, _brute(X, ids, rec, 25), rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize("edits", [10, 400])  # buffered, then past the rebuild threshold
+def test_query_after_upserts(store, edits):
+    index = NeighbourIndex.from_store(store)
+    X, ids = store_features(store), store.column("patient_id")
+    rng = np.random.default_rng(edits)
+    for row in rng.choice(len(store), edits, replace=False):
+        rec = dict(store.record(row), weight_kg=round(float(rng.uniform(2, 12)), 1))
+        index.upsert(rec)
+        X[row] = features(rec)
+    index.upsert(dict(store.record(0), patient_id="999999999"))  # a new patient
+    X, ids = np.vstack([X, features(store.record(0))]), np.append(ids, "999999999")
+    assert len(index) == len(ids)
+    for row in range(0, len(store), 131):
+        rec = dict(store.record(row), weight_kg=float(X[row, 0] * 0.5))
+        got_ids, _, _, d = index.query(rec, k=25)
+        assert rec["patient_id"] not in got_ids
+        np.testing.assert_allclose(d, _brute(X, ids, rec, 25), rtol=1e-5, atol=1e-5)
+
+def test_open_index_persists_and_rebuilds(store):
+    first = open_index(store)
+    again = open_index(store)
+    np.testing.assert_array_equal(first.ids, again.ids)
+    with open(f"{store.path}/neighbours.npz", "wb") as f:
+        f.write(b"not an npz")
+    assert len(open_index(store)) == len(store)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from patients import PatientStore, demo_columns, store_version, write_store
+
+def test_rewrite_leaves_open_store_readable(tmp_path):
+    path = str(tmp_path)
+    write_store(path, demo_columns(50000, seed=0))
+    old = PatientStore(path)
+    version = store_version(path)
+    write_store(path, demo_columns(100, seed=1))
+    assert store_version(path) != version
+    assert len(old) == 50000 and len(old.column("weight_kg")) == 50000
+    np.testing.assert_array_equal(old.column("weight_kg")[-5:], demo_columns(50000, seed=0)["weight_kg"][-5:].astype("f4"))
+    assert len(PatientStore(path)) == 100
+
+def test_mixed_columns_are_refused(tmp_path):
+    path = str(tmp_path)
+    write_store(path, demo_columns(200, seed=0))
+    np.save(tmp_path / "weight_kg.npy", np.zeros(50, "f4"))  # as if caught halfway through a rewrite
+    with pytest.raises(ValueError, match="weight_kg has 50"):
+        PatientStore(path)
@@ -0,0 +1,40 @@
+import numpy as np
+
+from risk import stable_slots, top_k
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(0)
+    for n, hi in [(1000, 101), (5000, 5), (300, 2), (50, 1000)]:  # risk-like, then heavy and total ties
+        scores = rng.integers(0, hi, n).astype(np.int16)
+        order = np.lexsort((np.arange(n), -scores.astype(np.int64)))  # highest first, ties to the lower row
+        for k in [0, 1, 7, 100, n - 1, n, n + 5]:
+            np.testing.assert_array_equal(top_k(scores, k), order[:k])
+    assert len(top_k(np.zeros(0, np.int16), 5)) == 0
+
+def test_top_k_is_stable_under_unrelated_changes():
+    # one score leaving the top k swaps in exactly one patient
+    scores = np.random.default_rng(1).integers(0, 101, 20000).astype(np.int16)
+    before = set(top_k(scores, 300).tolist())
+    scores[min(before)] = 0
+    after = set(top_k(scores, 300).tolist())
+    assert len(before - after) == 1 and len(after - before) == 1
+
+def test_stable_slots_keep_members_in_place():
+    rng = np.random.default_rng(0)
+    slots = stable_slots([], list(range(300)))
+    assert slots == list(range(300))
+    for _ in range(200):
+        members = set(slots)
+        members -= set(rng.choice(slots, int(rng.integers(0, 4)), replace=False).tolist())
+        members |= set(rng.integers(1000, 2000, int(rng.integers(0, 4))).tolist())
+        new = stable_slots(slots, sorted(members))
+        assert sorted(new) == sorted(members)
+        if len(new) >= len(slots):
+            assert all(new[i] == m for i, m in enumerate(slots) if m in members)
+            assert sum(a != b for a, b in zip(slots, new)) == len(set(slots) - members)
+        slots = new
+
+def test_stable_slots_fill_holes_from_the_end():
+    assert stable_slots(["a", "b", "c", "d"], ["a", "c", "d"]) == ["a", "d", "c"]
+    assert stable_slots(["a", "b"], ["a", "b", "x", "y"]) == ["a", "b", "x", "y"]
+    assert stable_slots(["a", "b", "c"], ["c", "z"]) == ["z", "c"]
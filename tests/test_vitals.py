@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+
+from vitals import VitalsHub, demo_samples
+
+def _hub():
+    # one-hour chart of 60 buckets over a 10-minute ring, so a 2 h feed wraps the ring many times
+    return VitalsHub(span_s=3600, points=60, raw_s=600)
+
+def test_chunked_feed_matches_bulk():
+    _, t, v = next(demo_samples(["p"], 1.7e9, 7200))
+    bulk = _hub()
+    bulk.append("p", t, v)
+    chunked = _hub()
+    rng = np.random.default_rng(0)
+    i = 0
+    while i < len(t):
+        n = int(rng.integers(1, 500))
+        chunked.append("p", t[i:i + n], v[i:i + n])
+        i += n
+    for a, b in zip(bulk.window("p"), chunked.window("p")):
+        np.testing.assert_array_equal(a, b)
+
+def test_replayed_samples_are_dropped():
+    _, t, v = next(demo_samples(["p"], 1.7e9, 1800))
+    once, twice = _hub(), _hub()
+    once.append("p", t, v)
+    twice.append("p", t[:1200], v[:1200])
+    twice.append("p", t, v)
+    for a, b in zip(once.window("p"), twice.window("p")):
+        np.testing.assert_array_equal(a, b)
+
+def test_points_are_actual_samples():
+    _, t, v = next(demo_samples(["p"], 1.7e9, 5400))
+    hub = _hub()
+    hub.append("p", t, v)
+    wt, wv, n = hub.window("p")
+    assert n == len(t)
+    assert len(wt) <= 61 + 2 + 1  # kept points, open buckets, latest sample
+    for col in range(wv.shape[1]):
+        rows = np.searchsorted(t, wt[:, col])
+        np.testing.assert_array_equal(t[rows], wt[:, col])
+        np.testing.assert_array_equal(v[rows, col].astype(np.float32), wv[:, col])
+
+def test_fast_feed_backlog():
+    # 10 Hz into a hub sized for 1 Hz: two buckets no longer fit in half the ring
+    _, t, v = next(demo_samples(["p"], 1.7e9, 3 * 3600, rate_hz=10))
+    bulk, chunked = VitalsHub(), VitalsHub()
+    bulk.append("p", t, v)
+    for i in range(0, len(t), 777):
+        chunked.append("p", t[i:i + 777], v[i:i + 777])
+    for a, b in zip(bulk.window("p"), chunked.window("p")):
+        np.testing.assert_array_equal(a, b)
+    assert bulk.window("p")[2] == len(t)
+
+def test_ring_grows_for_a_feed_faster_than_it_holds():
+    _, t, v = next(demo_samples(["p"], 1.7e9, 3600, rate_hz=50))
+    hub = _hub()
+    hub.append("p", t, v)
+    wt, _, n = hub.window("p")
+    assert n == len(t) and len(wt) > 50
+
+def test_failed_reads_are_reported(tmp_path):
+    hub = VitalsHub()
+    hub.follow(str(tmp_path), poll_s=0.01)  # a directory: every open fails
+    deadline = time.monotonic() + 5
+    while hub.errors < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert hub.errors >= 2 and "IsADirectoryError" in hub.error
@@ -0,0 +1,256 @@
+# views.py
+# HTML builders for the dashboard sections. They take plain values (a patient
+# record can be a dict or st.session_state) so any caller can reuse the markup.
+from charts import semi_gauge_svg, bar_svg, donut_svg
+from events import STAGES
+from patients import SHUNT_SIZES
+
+# ======================== THEME & GLOBAL CSS (Dark-blue) ========================
+THEME_CSS = """
+<style>
+header[data-testid="stHeader"]{display:none !important;}
+#MainMenu, footer{visibility:hidden !important;}
+.block-container{padding-top:4px !important; padding-bottom:4px !important; max-width:1400px;}
+[data-testid="stVerticalBlock"] > [style*="width"]{padding-top:2px !important; padding-bottom:2px !important;}
+[data-testid="column"]{padding:0 6px !important;}
+
+/* -------- Dark blue neutral theme -------- */
+:root{
+  --bg:#0F172A;                 /* page bg (deep slate/navy) */
+  --band:#12263F;               /* top band bg */
+  --band-border:#24425F;
+  --side:#12213B;               /* left nav card */
+  --ink:#F8FAFC;                /* default text: near-white */
+  --heading:#FFFFFF;            /* headings: pure white */
+  --muted:#C7D2FE;              /* readable light indigo */
+  --card:#0B1426;               /* dark card surface */
+  --border:#1E2A44;
+
+  --brand-coral:#F97362;        /* accents */
+  --brand-teal:#22D3EE;
+
+  /* BAR CHART = ALL REDS */
+  --bar1:#FCA5A5; --bar2:#F87171; --bar3:#EF4444; --bar4:#DC2626;
+
+  /* Donut */
+  --donut1:#F97362; --donut2:#22D3EE; --donut3:#38BDF8; --donut4:#93C5FD;
+}
+
+html, body, .stApp, [data-testid="stAppViewContainer"], .main {
+  background: var(--bg) !important; color: var(--ink) !important;
+}
+*{ color: var(--ink); font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, "Helvetica Neue", Arial, "Noto Sans", "Apple Color Emoji","Segoe UI Emoji"; }
+.muted{ color: var(--muted) !important; }
+
+/* Left card - more compact */
+.side{ background: var(--side); border:1px solid var(--band-border); border-radius:10px; padding:10px 14px; }
+.side h3{ margin:0 0 6px; letter-spacing:.14em; color: var(--heading); font-weight:1000; font-size:18px; line-height:1.1; white-space:nowrap; }
+.side p{ margin:2px 0 0; font-weight:800; font-size:13px; }
+
+/* Top band - more compact */
+.topband{ background: var(--band); border:1px solid var(--band-border); border-radius:8px; padding:8px 14px; margin-bottom:8px; position:relative; }
+.kvgrid{display:grid; grid-template-columns:repeat(7, 1fr); gap:12px; align-items:center;}
+.kv .label{ font-size:12px; font-weight:1000; letter-spacing:.12em; color: var(--heading); white-space:nowrap; }
+.kv .val{ margin-top:2px; font-size:15px; font-weight:900; }
+.baby{ width:38px;height:38px;border-radius:999px;border:2px solid var(--band-border); display:flex;align-items:center;justify-content:center;background:#0b1a30;font-size:18px; }
+
+/* Premature icon in top right - conditional */
+.premature-icon{ position:absolute; top:8px; right:14px; width:40px;height:40px;border-radius:999px;border:2px solid #F97362; display:flex;align-items:center;justify-content:center;background:#1a0f0f;font-size:18px; box-shadow:0 2px 6px rgba(249,115,98,0.3); }
+.premature-icon.hidden{ display:none; }
+
+/* Risk section at top - more compact */
+.risk-header{ background:linear-gradient(135deg, #1a0f0f 0%, #2a1515 100%); border:2px solid #F97362; border-radius:10px; padding:10px 14px; margin-bottom:8px; box-shadow:0 3px 10px rgba(249,115,98,0.2); }
+.risk-title{ font-weight:1000; font-size:18px; letter-spacing:.08em; color: #F97362; text-align:center; margin-bottom:6px; }
+.risk-display{ display:flex; align-items:center; justify-content:space-around; gap:16px; }
+.risk-percentage{ font-size:42px; font-weight:1000; color: #F97362; text-align:center; line-height:1; }
+.risk-label{ font-size:12px; font-weight:800; color: var(--muted); text-align:center; margin-top:3px; letter-spacing:.08em; }
+.risk-toggle-container{ display:flex; align-items:center; justify-content:center; gap:8px; margin-top:6px; }
+
+/* Headings - more compact */
+.h2{font-weight:1000; font-size:17px; letter-spacing:.08em; color: var(--heading); white-space:nowrap; margin:4px 0 3px;}
+.h3{font-weight:900;  font-size:15px; letter-spacing:.06em; color: var(--heading); white-space:nowrap; margin:3px 0 2px;}
+
+/* Cards - more compact */
+.card{background:var(--card); border:1px solid var(--border); border-radius:10px; padding:8px 12px;}
+.card + .card{margin-top:6px;}
+
+/* Flow (steps 1..6) - more compact */
+.flowgrid{display:grid; grid-template-columns: 1fr 28px 1fr 28px 1fr; row-gap:10px; column-gap:8px; align-items:center; margin-top:4px;}
+.stage{ background:#3A0E0E;border:1px solid #7A2E2E;border-radius:7px; padding:6px 8px;min-width:120px;text-align:center;font-weight:900; color:#FEE2E2; font-size:12px; transition:all .15s ease-in-out; }
+.stage.active{ box-shadow:0 0 0 3px var(--brand-coral) inset; transform:translateY(-2px); }
+.connector{height:2px;background:#7A2E2E;position:relative;border-radius:2px;}
+.connector:after{content:"";position:absolute;right:-4px;top:-2px;border-left:6px solid #7A2E2E;border-top:4px solid transparent;border-bottom:4px solid transparent;}
+.stepbadge{ width:22px;height:22px;border-radius:50%;border:2px dashed #CBD5E1;display:flex;align-items:center;justify-content:center; color:#E2E8F0;font-weight:900;background:#0B1426;margin:0 auto 3px; font-size:10px; }
+.stepbadge.hit{ border-style:solid; border-color:var(--brand-coral); background:#3A0E0E; }
+.stagecount{ font-size:11px; font-weight:700; color:#FCA5A5; margin-top:2px; }
+.connector .prob{ position:absolute; left:50%; top:-16px; transform:translateX(-50%); font-size:10px; font-weight:900; color:var(--muted); }
+
+/* Charts layout */
+.donutwrap{display:flex;align-items:center;justify-content:flex-end; width:100%;}
+.gaugewrap{display:flex;align-items:center;justify-content:center;}
+
+/* Compact gauge for top - smaller */
+.risk-gauge-wrap{display:flex;align-items:center;justify-content:center; padding:2px 0; transform:scale(0.85);}
+
+/* Pill - more compact */
+.pillbar{ height:36px;border-radius:999px;background:linear-gradient(90deg, #ef4444 0%, #fb923c 40%, #22c55e 100%); display:flex;align-items:center;justify-content:center;border:1px solid #1f2e4a; }
+.pillbar .chip{background:#FFE680;color:#111;border:2px solid #d8b84f;border-radius:18px;padding:4px 10px;font-weight:1000; font-size:12px;}
+.pillcaption{font-weight:1000;text-align:center;margin-top:6px;color:#E2E8F0; font-size:13px;}
+
+/* Compact form elements */
+[data-testid="stSelectbox"], [data-testid="stDateInput"], [data-testid="stNumberInput"], [data-testid="stTextArea"], [data-testid="stToggle"]{margin-bottom:6px !important;}
+label{margin-bottom:3px !important;}
+</style>
+"""
+
+# ======================== SECTIONS ========================
+def risk_header_html(risk_pct:int, is_premature:bool, premature_points:float=15)->str:
+    return f"""
+    <div class="risk-header">
+      <div class="risk-title">⚠️ PATIENT RISK ASSESSMENT ⚠️</div>
+      <div class="risk-display">
+        <div>
+          <div class="risk-percentage">{risk_pct}%</div>
+          <div class="risk-label">RISK LEVEL</div>
+        </div>
+        <div class="risk-gauge-wrap">
+          {semi_gauge_svg(risk_pct, compact=True)}
+        </div>
+        <div>
+          <div class="risk-percentage" style="font-size:32px;">{risk_pct}</div>
+          <div class="risk-label">/ 100</div>
+        </div>
+      </div>
+      <div class="risk-toggle-container">
+        <label style="font-size:12px; font-weight:700; color:var(--muted);">Premature Status:</label>
+        <span style="font-size:13px; font-weight:900; color:{'#F97362' if is_premature else '#C7D2FE'};">
+          {f"✓ PREMATURE (+{premature_points:.0f}% risk)" if is_premature else 'Not Premature'}
+        </span>
+      </div>
+    </div>
+    """
+
+def topband_html(p)->str:
+    # Top band with conditional premature icon
+    premature_class = "hidden" if not p["is_premature"] else ""
+    gest_label = f"{int(p['gest_weeks'])} weeks {int(p['gest_days'])} days"
+    return f"""
+    <div class="topband">
+      <div class="premature-icon {premature_class}">👶</div>
+      <div class="kvgrid">
+        <div class="kv"><div class="label">PATIENT&nbsp;ID</div><div class="val muted">{p['patient_id']}</div></div>
+        <div class="kv"><div class="label">DOB</div><div class="val muted">{p['dob'].strftime("%m/%d/%Y")}</div></div>
+        <div class="kv"><div class="label">GENDER</div><div class="val muted">{p['gender']}</div></div>
+        <div class="kv"><div class="label">RACE/ETHNICITY</div><div class="val muted">{p['race_eth']}</div></div>
+        <div class="kv"><div class="label">WEIGHT</div><div class="val muted">{p['weight_current']:.1f} kg</div></div>
+        <div class="kv"><div class="label">GEST&nbsp;AGE</div><div class="val muted">{gest_label}</div></div>
+        <div class="baby">👶</div>
+      </div>
+    </div>
+    """
+
+def surgical_html(p)->str:
+    return f"""
+        <div class="muted" style="font-size:13px;">Systemic-to-Pulmonary Shunt Placement</div>
+        <div style="margin-top:4px; font-size:12px; line-height:1.6;">
+          <b>DATE OF SURG:</b> {p['date_of_surg'].strftime("%m/%d/%Y")}<br>
+          <b>AGE AT SURGERY:</b> {p['age_months']} months {p['age_days']} days<br>
+          <b>WEIGHT AT SURGERY:</b> {p['weight_kg']:.1f} kg<br>
+          <b>BODY MASS INDEX:</b> {p['bmi_cat']}<br>
+          <b>CPB TIME:</b> {p['cpb_time']} minutes<br>
+          <b>CONCURRENT TAPVR REPAIR:</b> {p['tapvr']}
+        </div>
+        """
+
+FLOW_LABELS = ["Cardiac<br>Arrest", "Reoperation<br>Bleed", "Sepsis",
+               "Chylothorax<br>Intervention", "Stroke", "Sudden<br>Hypoxemia"]
+
+def flow_html(stage_counts=None, probabilities=None, highlight:str=None, patient_stages=())->str:
+    # Two rows, steps 1..6. With an event log each stage shows its cohort count and
+    # each connector the share of patients moving straight on to the next step;
+    # stages this patient has had get a solid badge.
+    def stage(i):
+        badge = "stepbadge hit" if STAGES[i] in patient_stages else "stepbadge"
+        klass = "stage active" if STAGES[i] == highlight else "stage"
+        count = "" if stage_counts is None else f'<div class="stagecount">{int(stage_counts[i]):,}</div>'
+        return f'<div><div class="{badge}">{i+1}</div><div class="{klass}">{FLOW_LABELS[i]}{count}</div></div>'
+
+    def connector(i):
+        if probabilities is None:
+            return '<div class="connector"></div>'
+        return f'<div class="connector"><span class="prob">{100*probabilities[i][i+1]:.0f}%</span></div>'
+
+    rows = [f'<div class="flowgrid"{style}>' + connector(a).join([stage(a), stage(a+1)]) + connector(a+1) + stage(a+2) + '</div>'
+            for a, style in [(0, ""), (3, ' style="margin-top:4px;"')]]
+    return "\n".join(rows)
+
+def donut_segments(shunt_pcts)->list:
+    return [("5.0 mm", shunt_pcts[0], "var(--donut1)"),
+            ("4.0 mm", shunt_pcts[1], "var(--donut2)"),
+            ("3.5 mm", shunt_pcts[2], "var(--donut3)"),
+            ("3.0 mm", shunt_pcts[3], "var(--donut4)")]
+
+def pill_html(p=None, summary=None)->str:
+    # This patient's shunt:weight placed among comparable patients (see neighbours.shunt_summary);
+    # the static placeholder when there is no patient history to compare against.
+    if summary is None:
+        return ('<div class="pillbar"><span class="chip">PATIENT XYZ</span></div>'
+                '<div class="pillcaption">3.5 MM: 5 KG</div>')
+    left = min(88, max(12, summary["percentile"]))
+    dist = " · ".join(f"{size} {pct:.0f}%" for size, pct in zip(SHUNT_SIZES, summary["pcts"]))
+    return (f'<div class="pillbar" style="position:relative;">'
+            f'<span class="chip" style="position:absolute; left:{left:.0f}%; transform:translateX(-50%);">'
+            f'PATIENT {p["patient_id"]}</span></div>'
+            f'<div class="pillcaption">{p["shunt_mm"].upper()}: {float(p["weight_kg"]):g} KG</div>'
+            f'<div class="muted" style="text-align:center; font-size:11px; margin-top:2px;">'
+            f'shunt:weight above {summary["percentile"]:.0f}% of {summary["n"]} similar patients · most got {summary["common"]}<br>{dist}</div>')
+
+# ======================== STANDALONE PAGE ========================
+# Stand-ins for the Streamlit columns when the dashboard is rendered outside the app.
+PAGE_CSS = """
+<style>
+body{ margin:0; padding:16px; }
+.page{ max-width:1120px; margin:0 auto; }
+.row{ display:grid; gap:32px; align-items:start; margin-top:6px; }
+.row1{ grid-template-columns:0.60fr 0.40fr; }
+.row2{ grid-template-columns:0.58fr 0.42fr; margin-top:12px; }
+@media print{ body{ -webkit-print-color-adjust:exact; print-color-adjust:exact; } }
+</style>
+"""
+
+def patient_page_html(p, risk_pct:int, counts, shunt_pcts, premature_points:float=15, shunt_summary=None,
+                      flow:dict=None)->str:
+    # The Patient Overview for one patient as a self-contained HTML document; `flow`
+    # holds flow_html's keyword arguments when there is an event log.
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Patient Overview · {p['patient_id']}</title>
+{THEME_CSS}{PAGE_CSS}</head>
+<body><div class="page">
+{risk_header_html(risk_pct, p['is_premature'], premature_points)}
+{topband_html(p)}
+<div class="row row1">
+  <div>
+    <div class="h2">FUNDAMENTAL&nbsp;DIAGNOSIS</div>
+    <div class="muted">short summary of diagnosis</div>
+    <div class="h2" style="margin-top:8px;">SURGICAL&nbsp;PROCEDURE</div>
+    {surgical_html(p)}
+  </div>
+  <div>
+    <div class="h2">GENETIC&nbsp;ABNORMALITIES</div>
+    {bar_svg(counts)}
+  </div>
+</div>
+<div class="row row2">
+  <div>
+    <div class="h3">POST&nbsp;OPERATIVE&nbsp;COMPLICATIONS (STEPS&nbsp;1–6)</div>
+    {flow_html(**(flow or {}))}
+  </div>
+  <div>
+    <div class="h2" style="text-align:center;">SHUNT&nbsp;SIZE</div>
+    <div class="donutwrap">{donut_svg(donut_segments(shunt_pcts))}</div>
+    <div class="h2" style="margin-top:6px; text-align:center;">SHUNT:WEIGHT</div>
+    {pill_html(p, shunt_summary)}
+  </div>
+</div>
+</div></body></html>
+"""
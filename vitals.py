@@ -0,0 +1,336 @@
+# vitals.py
+# Post-op vitals: a streaming feed into fixed-size per-patient ring buffers, and
+# an incremental Largest-Triangle-Three-Buckets (LTTB) downsampler for the
+# POST-OP VITALS chart.
+#
+#   python vitals.py simulate data/vitals.csv --ids 100000000,100000001   # 72 h of history, then live 1 Hz
+#   VITALS_SOURCE=data/vitals.csv streamlit run app.py                    # or VITALS_SOURCE=tcp://127.0.0.1:9100
+#
+# Feed lines are CSV: patient_id,unix_ts,hr,spo2,map,rr. A file source is
+# followed like `tail -f` and a tcp:// source accepts any number of line-writing
+# connections.
+#
+# The ring buffer keeps the recent raw samples (6 h by default). The chart covers
+# 72 h from the downsampler, which closes one time bucket at a time: once a
+# bucket and the one after it are complete, its point is chosen and never
+# revisited. A refresh costs only the samples that arrived since the last one.
+import argparse
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+VITALS = ["hr", "spo2", "map", "rr"]
+SPAN_S = 72 * 3600   # chart window
+POINTS = 300         # downsampled points per vital over the window
+RAW_S = 6 * 3600     # raw samples kept per patient
+RATE_HZ = 1.0
+
+log = logging.getLogger(__name__)
+
+# ======================== RING BUFFER ========================
+class RingBuffer:
+    # Fixed-capacity sample buffer addressed by absolute sample number; the oldest samples are overwritten.
+    def __init__(self, capacity:int, width:int=len(VITALS)):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.v = np.zeros((capacity, width), dtype=np.float32)
+        self.n = 0  # samples ever appended
+
+    @property
+    def first(self)->int:
+        # oldest sample number still held
+        return max(0, self.n - self.capacity)
+
+    def append(self, t:np.ndarray, v:np.ndarray):
+        if len(t) > self.capacity:
+            self.n += len(t) - self.capacity
+            t, v = t[-self.capacity:], v[-self.capacity:]
+        pos = self.n % self.capacity
+        head = min(len(t), self.capacity - pos)
+        self.t[pos:pos + head], self.v[pos:pos + head] = t[:head], v[:head]
+        self.t[:len(t) - head], self.v[:len(t) - head] = t[head:], v[head:]
+        self.n += len(t)
+
+    def slice(self, start:int, stop:int):
+        # (t, v) for sample numbers [start, stop), which must still be held
+        if start < self.first:
+            raise IndexError(f"samples {start}..{self.first} have been overwritten")
+        i, j = start % self.capacity, (stop - 1) % self.capacity + 1
+        if stop - start <= 0:
+            return self.t[:0], self.v[:0]
+        if i < j:
+            return self.t[i:j], self.v[i:j]
+        return np.concatenate([self.t[i:], self.t[:j]]), np.concatenate([self.v[i:], self.v[:j]])
+
+    def last(self):
+        i = (self.n - 1) % self.capacity
+        return self.t[i], self.v[i]
+
+    def grown(self, capacity:int):
+        # A bigger ring holding the same samples under the same sample numbers
+        ring = RingBuffer(capacity, self.v.shape[1])
+        ring.n = self.first
+        ring.append(*self.slice(self.first, self.n))
+        return ring
+
+# ======================== DOWNSAMPLING ========================
+class IncrementalLTTB:
+    # LTTB over fixed time buckets (bucket = floor(t / bucket_s)), one series per column.
+    def __init__(self, bucket_s:float, keep:int):
+        self.bucket_s = bucket_s
+        self.points = deque(maxlen=keep)  # (t[k], v[k]) chosen for each finalized bucket
+        self._pending = []                # [bucket id, start, stop] not yet final; the last one is open
+        self._prev = None
+
+    def needed_from(self, n:int)->int:
+        # oldest sample number still needed (the first bucket not yet final), n if none
+        return self._pending[0][1] if self._pending else n
+
+    def update(self, ring:RingBuffer, start:int, stop:int):
+        # Account for newly appended samples [start, stop).
+        t, _ = ring.slice(start, stop)
+        ids = np.floor(t / self.bucket_s).astype(np.int64)
+        cuts = np.flatnonzero(np.diff(ids)) + 1
+        for s, e in zip(np.r_[0, cuts], np.r_[cuts, len(ids)]):
+            if self._pending and self._pending[-1][0] == ids[s]:
+                self._pending[-1][2] = start + e
+            else:
+                self._pending.append([ids[s], start + s, start + e])
+        while len(self._pending) >= 3:
+            self._prev = self._choose(ring, self._pending[0], self._pending[1], self._prev)
+            self.points.append(self._prev)
+            self._pending.pop(0)
+
+    def _choose(self, ring, bucket, after, prev):
+        # The sample in `bucket` forming the largest triangle with `prev` and the mean of the bucket after it.
+        t, v = ring.slice(bucket[1], bucket[2])
+        width = v.shape[1]
+        if prev is None:
+            return np.repeat(t[0], width), v[0].copy()
+        nt, nv = ring.slice(after[1], after[2])
+        ct, cv = nt.mean(), nv.mean(axis=0)
+        at, av = prev
+        area = np.abs((at - ct) * (v - av) - (at - t[:, None]) * (cv - av))
+        best = area.argmax(axis=0)
+        return t[best], v[best, np.arange(width)]
+
+    def series(self, ring:RingBuffer):
+        # (t, v) arrays of shape (points, columns): finalized points, provisional picks, then the latest sample.
+        pts, prev = list(self.points), self._prev
+        for bucket, after in zip(self._pending[:-1], self._pending[1:]):
+            prev = self._choose(ring, bucket, after, prev)
+            pts.append(prev)
+        if ring.n:
+            t, v = ring.last()
+            pts.append((np.repeat(t, ring.v.shape[1]), v.copy()))
+        if not pts:
+            return np.zeros((0, ring.v.shape[1])), np.zeros((0, ring.v.shape[1]), dtype=np.float32)
+        return np.stack([p[0] for p in pts]), np.stack([p[1] for p in pts])
+
+# ======================== HUB ========================
+class PatientVitals:
+    def __init__(self, capacity:int, bucket_s:float, keep:int):
+        self.ring = RingBuffer(capacity)
+        self.lttb = IncrementalLTTB(bucket_s, keep)
+        self.lock = threading.Lock()
+
+    def append(self, t:np.ndarray, v:np.ndarray):
+        with self.lock:
+            if self.ring.n:
+                fresh = t > self.ring.last()[0]  # drop replays and out-of-order samples
+                t, v = t[fresh], v[fresh]
+            # Append in chunks that stop short of overwriting a bucket the downsampler hasn't
+            # finalized. If the open buckets fill the ring (a feed faster than the hub was
+            # sized for), the ring grows instead.
+            i = 0
+            while i < len(t):
+                room = self.ring.capacity - (self.ring.n - self.lttb.needed_from(self.ring.n))
+                if room <= 0:
+                    self.ring = self.ring.grown(2 * self.ring.capacity)
+                    continue
+                start = self.ring.n
+                self.ring.append(t[i:i + room], v[i:i + room])
+                self.lttb.update(self.ring, start, self.ring.n)
+                i += room
+
+    def window(self):
+        # (t, v, samples received) for the chart
+        with self.lock:
+            t, v = self.lttb.series(self.ring)
+            return t, v, self.ring.n
+
+class VitalsHub:
+    # Every patient's stream, shared by all sessions. The least recently updated patient is dropped past max_patients.
+    def __init__(self, span_s:float=SPAN_S, points:int=POINTS, raw_s:float=RAW_S, rate_hz:float=RATE_HZ,
+                 max_patients:int=512):
+        self.span_s = span_s
+        self.bucket_s = span_s / points
+        self.capacity = max(int(raw_s * rate_hz), int(6 * self.bucket_s * rate_hz))  # >= 3 buckets per half ring
+        self.keep = points + 1
+        self.max_patients = max_patients
+        self._patients = OrderedDict()
+        self._lock = threading.Lock()
+        self.errors = 0     # feed batches or reads that failed
+        self.error = None   # the last failure, for the dashboard
+
+    def append(self, patient_id:str, t, v):
+        with self._lock:
+            pv = self._patients.get(patient_id)
+            if pv is None:
+                pv = self._patients[patient_id] = PatientVitals(self.capacity, self.bucket_s, self.keep)
+                if len(self._patients) > self.max_patients:
+                    self._patients.popitem(last=False)
+            self._patients.move_to_end(patient_id)
+        pv.append(np.asarray(t, dtype=np.float64), np.asarray(v, dtype=np.float32).reshape(len(t), len(VITALS)))
+
+    def ingest_lines(self, lines):
+        # Parse a batch of feed lines and append each patient's samples in one go; malformed lines are skipped.
+        rows = {}
+        for line in lines:
+            parts = line.strip().split(",")
+            if len(parts) != 2 + len(VITALS):
+                continue
+            try:
+                rows.setdefault(parts[0], []).append([float(x) for x in parts[1:]])
+            except ValueError:
+                continue
+        for patient_id, samples in rows.items():
+            a = np.array(samples)
+            try:
+                self.append(patient_id, a[:, 0], a[:, 1:])
+            except Exception as e:  # one patient's bad batch mustn't stop the feed for everyone
+                self._failed(f"patient {patient_id}", e)
+
+    def _failed(self, what:str, e:Exception):
+        with self._lock:
+            self.errors += 1
+            self.error = f"{what}: {type(e).__name__}: {e}"
+        log.exception("vitals feed: %s failed", what)
+
+    def window(self, patient_id:str):
+        pv = self._patients.get(str(patient_id))
+        return None if pv is None else pv.window()
+
+    def __contains__(self, patient_id):
+        return str(patient_id) in self._patients
+
+    def __len__(self):
+        return len(self._patients)
+
+    # ---- sources ----
+    def follow(self, path:str, poll_s:float=0.5, batch:int=65536):
+        # Read the file from the start, then keep reading appended lines. A failed read reopens the
+        # file after a backoff; samples already held are dropped as replays.
+        def run():
+            failures = 0
+            while True:
+                try:
+                    while not os.path.exists(path):
+                        time.sleep(poll_s)
+                    with open(path) as f:
+                        tail = ""
+                        while True:
+                            chunk = f.read(batch * 48)
+                            if not chunk:
+                                time.sleep(poll_s)
+                                continue
+                            lines = (tail + chunk).split("\n")
+                            tail = lines.pop()  # partial last line
+                            self.ingest_lines(lines)
+                            failures = 0
+                except Exception as e:
+                    self._failed(f"reading {path}", e)
+                    failures += 1
+                    time.sleep(min(5.0, poll_s * 2 ** failures))
+        threading.Thread(target=run, name=f"vitals-follow:{path}", daemon=True).start()
+
+    def listen(self, host:str, port:int):
+        # Line-oriented TCP endpoint; each connection streams feed lines.
+        hub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                tail = b""
+                try:
+                    while True:
+                        chunk = self.request.recv(1 << 16)
+                        if not chunk:
+                            break
+                        lines = (tail + chunk).split(b"\n")
+                        tail = lines.pop()
+                        hub.ingest_lines(line.decode("utf-8", "replace") for line in lines)
+                    hub.ingest_lines([tail.decode("utf-8", "replace")])
+                except Exception as e:
+                    hub._failed(f"connection from {self.client_address[0]}", e)
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name=f"vitals-listen:{port}", daemon=True).start()
+        return server
+
+def open_source(source:str)->VitalsHub:
+    # VITALS_SOURCE: a file path, or tcp://host:port
+    hub = VitalsHub()
+    if source.startswith("tcp://"):
+        host, _, port = source[len("tcp://"):].rpartition(":")
+        hub.listen(host or "127.0.0.1", int(port))
+    else:
+        hub.follow(source)
+    return hub
+
+# ======================== DEMO FEED ========================
+def demo_samples(patient_ids, t0:float, seconds:int, rate_hz:float=RATE_HZ, seed:int=0):
+    # Plausible infant post-op vitals; yields (patient_id, t, v[n, 4]) per patient.
+    rng = np.random.default_rng(seed)
+    t = t0 + np.arange(int(seconds * rate_hz)) / rate_hz
+    for i, patient_id in enumerate(patient_ids):
+        phase = rng.uniform(0, 2 * np.pi)
+        drift = np.sin(2 * np.pi * (t - t0) / 86400 + phase)
+        walk = np.cumsum(rng.normal(0, 0.01, (len(t), len(VITALS))), axis=0)
+        walk -= np.linspace(0, 1, len(t))[:, None] * walk[-1]  # pin the walk so it doesn't wander off
+        v = np.stack([140 + 12 * drift + 4 * walk[:, 0] + rng.normal(0, 2, len(t)),
+                      82 + 3 * drift + 1.5 * walk[:, 1] + rng.normal(0, 1, len(t)),
+                      48 + 6 * drift + 2 * walk[:, 2] + rng.normal(0, 1.5, len(t)),
+                      40 + 6 * drift + 2 * walk[:, 3] + rng.normal(0, 2, len(t))], axis=1)
+        yield patient_id, t, np.clip(v, [40, 50, 20, 5], [220, 100, 110, 90])
+
+def _write_lines(f, patient_id, t, v):
+    f.writelines(f"{patient_id},{ts:.3f},{r[0]:.0f},{r[1]:.0f},{r[2]:.0f},{r[3]:.0f}\n" for ts, r in zip(t, v))
+
+def simulate(path:str, patient_ids, hours:float, live:bool=True, seed:int=0):
+    now = time.time()
+    with open(path, "w") as f:
+        for patient_id, t, v in demo_samples(patient_ids, now - hours * 3600, int(hours * 3600), seed=seed):
+            _write_lines(f, patient_id, t, v)
+    print(f"wrote {hours:g} h of history for {len(patient_ids)} patients to {path}", file=sys.stderr)
+    tick = 0
+    while live:
+        time.sleep(1.0)
+        tick += 1
+        with open(path, "a") as f:
+            for patient_id, t, v in demo_samples(patient_ids, time.time(), 1, seed=seed + tick):
+                _write_lines(f, patient_id, t, v)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Post-op vitals feed tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sim = sub.add_parser("simulate", help="write a demo feed file, then keep appending at 1 Hz")
+    sim.add_argument("path")
+    sim.add_argument("--ids", default="100000000", help="comma-separated patient ids")
+    sim.add_argument("--hours", type=float, default=72.0, help="hours of history to write first")
+    sim.add_argument("--no-live", action="store_true", help="stop after writing the history")
+    args = ap.parse_args(argv)
+    try:
+        simulate(args.path, [i.strip() for i in args.ids.split(",") if i.strip()], args.hours, not args.no_live)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())